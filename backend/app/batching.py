@@ -0,0 +1,183 @@
+import asyncio
+import time
+from typing import List, Optional, Set, Tuple
+
+import numpy as np
+
+from app import inference
+from app.config import settings
+from app.executor import InferenceSaturated, executor
+from app.shadow import shadow
+
+
+class BatchStats:
+    """Running counters for the micro-batcher."""
+
+    def __init__(self):
+        self.batches = 0
+        self.rows = 0
+        self.errors = 0
+        self.max_batch_size = 0
+        self.total_queue_latency = 0.0
+        self.max_queue_latency = 0.0
+
+    def record(self, size: int, latencies: List[float]):
+        self.batches += 1
+        self.rows += size
+        self.max_batch_size = max(self.max_batch_size, size)
+        if latencies:
+            self.total_queue_latency += sum(latencies)
+            self.max_queue_latency = max(self.max_queue_latency, max(latencies))
+
+    def as_dict(self) -> dict:
+        return {
+            "batches": self.batches,
+            "rows": self.rows,
+            "errors": self.errors,
+            "avg_batch_size": self.rows / self.batches if self.batches else 0.0,
+            "max_batch_size": self.max_batch_size,
+            "avg_queue_latency_ms": 1000 * self.total_queue_latency / self.rows if self.rows else 0.0,
+            "max_queue_latency_ms": 1000 * self.max_queue_latency,
+        }
+
+
+# (features, future, enqueue time)
+_Item = Tuple[dict, asyncio.Future, float]
+
+
+class InferenceBatcher:
+    """
+    Collects readings that arrive within a short window and scores them
+    with one model call. Each caller awaits its own row's result.
+    """
+
+    def __init__(self, max_batch_size: int, window_ms: float, max_pending: int):
+        self.max_batch_size = max(1, max_batch_size)
+        self.window = window_ms / 1000.0
+        self.stats = BatchStats()
+        self.max_pending = max_pending
+        self.pending = 0
+        self.rejected = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done() or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+
+    async def submit(self, features: dict) -> dict:
+        """Queue one reading for scoring and wait for its prediction."""
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise InferenceSaturated(settings.INFERENCE_RETRY_AFTER_S)
+        self._ensure_worker()
+        future = self._loop.create_future()
+        self._queue.put_nowait((features, future, time.perf_counter()))
+        self.pending += 1
+        try:
+            return await future
+        finally:
+            self.pending -= 1
+
+    async def score_rows(self, version: str, X: np.ndarray) -> np.ndarray:
+        """
+        Score an already-built batch (bulk ingest) in one call. Its rows
+        count against the same INFERENCE_MAX_PENDING as submit(); a batch
+        larger than that is only admitted when nothing else is pending.
+        """
+        rows = len(X)
+        if self.pending and self.pending + rows > self.max_pending:
+            self.rejected += rows
+            raise InferenceSaturated(settings.INFERENCE_RETRY_AFTER_S)
+        self.pending += rows
+        try:
+            return await executor.run(inference.score_version, version, X)
+        finally:
+            self.pending -= rows
+
+    async def _collect(self) -> List[_Item]:
+        batch = [await self._queue.get()]
+        deadline = self._loop.time() + self.window
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            timeout = deadline - self._loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            # Score concurrently so the next batch can form while this one runs
+            task = self._loop.create_task(self._score(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _score(self, batch: List[_Item]):
+        started = time.perf_counter()
+        rows, readings, pending, latencies = [], [], [], []
+        try:
+            # One model for the whole batch, even if a reload swaps it mid-way
+            active = await inference.current_async()
+        except Exception as e:
+            self.stats.errors += len(batch)
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for features, future, queued in batch:
+            if future.cancelled():
+                continue
+            try:
+                rows.append(active.feature_vector(features))
+                readings.append(features)
+                pending.append(future)
+                latencies.append(started - queued)
+            except (KeyError, TypeError, ValueError) as e:
+                self.stats.errors += 1
+                future.set_exception(e)
+        self.stats.record(len(rows), latencies)
+        if not rows:
+            return
+        try:
+            probas = await executor.run(inference.score_version, active.version, np.array(rows, dtype=np.float32))
+        except Exception as e:
+            self.stats.errors += len(pending)
+            for future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        shadow.observe(active, readings, probas)
+        for future, proba in zip(pending, probas):
+            if not future.done():
+                future.set_result(active.label(proba))
+
+    async def close(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        executor.shutdown()
+
+
+batcher = InferenceBatcher(
+    max_batch_size=settings.INFERENCE_BATCH_MAX_SIZE,
+    window_ms=settings.INFERENCE_BATCH_WINDOW_MS,
+    max_pending=settings.INFERENCE_MAX_PENDING,
+)
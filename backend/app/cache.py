@@ -0,0 +1,209 @@
+"""
+Response cache for the dashboard read endpoints.
+
+Entries are tagged with the device ids they depend on ("*" for views
+over all devices) so that writes only invalidate the affected keys.
+Views over all devices change with every write, so by default they are
+left to expire after CACHE_TTL_S rather than being invalidated (set
+CACHE_INVALIDATE_ALL_DEVICE_VIEWS to drop them on every write instead).
+Every cached response carries an ETag; a matching If-None-Match gets a
+304 without a body.
+"""
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Set, Tuple
+
+import orjson
+from bson import ObjectId
+from fastapi import Request, Response
+
+from app.config import settings
+
+ALL_DEVICES = "*"
+
+# (body, etag, extra headers)
+Entry = Tuple[bytes, str, Dict[str, str]]
+
+
+def _default(value):
+    # orjson handles datetimes itself
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+class MemoryBackend:
+    """In-process LRU with per-entry TTL."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Entry, Set[str]]]" = OrderedDict()
+        self._tags: Dict[str, Set[str]] = {}
+
+    async def get(self, key: str) -> Optional[Entry]:
+        item = self._entries.get(key)
+        if item is None:
+            return None
+        expires, entry, _ = item
+        if expires < time.monotonic():
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    async def set(self, key: str, entry: Entry, ttl: float, tags: Set[str]):
+        self._drop(key)
+        self._entries[key] = (time.monotonic() + ttl, entry, tags)
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+
+    async def invalidate(self, tags: Iterable[str]) -> int:
+        keys = set()
+        for tag in tags:
+            keys |= self._tags.pop(tag, set())
+        for key in keys:
+            self._drop(key)
+        return len(keys)
+
+    def _drop(self, key: str):
+        item = self._entries.pop(key, None)
+        if item is None:
+            return
+        for tag in item[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+class RedisBackend:
+    """Redis (or any Redis-compatible server) shared between workers."""
+
+    def __init__(self, url: str, prefix: str = "vapeguard:cache:"):
+        import redis.asyncio as redis
+        self.redis = redis.from_url(url)
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Optional[Entry]:
+        raw = await self.redis.get(self.prefix + key)
+        if raw is None:
+            return None
+        body, etag, headers = json.loads(raw)
+        return body.encode(), etag, headers
+
+    async def set(self, key: str, entry: Entry, ttl: float, tags: Set[str]):
+        body, etag, headers = entry
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.set(self.prefix + key, json.dumps([body.decode(), etag, headers]), px=int(ttl * 1000))
+            for tag in tags:
+                pipe.sadd(f"{self.prefix}tag:{tag}", key)
+                # The set is only needed while its newest entry lives
+                pipe.pexpire(f"{self.prefix}tag:{tag}", int(ttl * 1000))
+            await pipe.execute()
+
+    async def invalidate(self, tags: Iterable[str]) -> int:
+        keys = set()
+        for tag in tags:
+            tag_key = f"{self.prefix}tag:{tag}"
+            keys |= {k.decode() for k in await self.redis.smembers(tag_key)}
+            await self.redis.delete(tag_key)
+        if keys:
+            await self.redis.delete(*(self.prefix + k for k in keys))
+        return len(keys)
+
+
+class NullBackend:
+    async def get(self, key: str) -> Optional[Entry]:
+        return None
+
+    async def set(self, key: str, entry: Entry, ttl: float, tags: Set[str]):
+        pass
+
+    async def invalidate(self, tags: Iterable[str]) -> int:
+        return 0
+
+
+def _make_backend():
+    if settings.CACHE_BACKEND == "redis":
+        return RedisBackend(settings.CACHE_REDIS_URL)
+    if settings.CACHE_BACKEND == "none":
+        return NullBackend()
+    return MemoryBackend(settings.CACHE_MAX_ENTRIES)
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """Whether an If-None-Match header (`*` or a list of possibly weak ETags) matches `etag`."""
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+class ResponseCache:
+    def __init__(self, backend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.invalidated = 0
+
+    @staticmethod
+    def key_for(request: Request) -> str:
+        query = "&".join(sorted(f"{k}={v}" for k, v in request.query_params.multi_items()))
+        return f"{request.url.path}?{query}"
+
+    async def respond(
+        self,
+        request: Request,
+        tags: Iterable[str],
+        load: Callable[[], Awaitable[Tuple[object, Dict[str, str]]]],
+    ) -> Response:
+        """
+        Serve `request` from the cache, or call `load()` for the payload
+        and extra headers and cache the encoded result under `tags`.
+        """
+        key = self.key_for(request)
+        entry = await self.backend.get(key)
+        if entry is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            payload, headers = await load()
+            body = orjson.dumps(payload, default=_default)
+            entry = (body, f'"{hashlib.sha1(body).hexdigest()}"', headers)
+            await self.backend.set(key, entry, self.ttl, set(tags))
+
+        body, etag, headers = entry
+        headers = {**headers, "ETag": etag}
+        if _etag_matches(request.headers.get("if-none-match", ""), etag):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    async def invalidate_devices(self, device_ids: Iterable[str], all_devices: bool = False):
+        """Drop entries for `device_ids`; views over all devices too if `all_devices` (or configured)."""
+        tags = set(device_ids)
+        if all_devices or settings.CACHE_INVALIDATE_ALL_DEVICE_VIEWS:
+            tags.add(ALL_DEVICES)
+        self.invalidated += await self.backend.invalidate(tags)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": settings.CACHE_BACKEND,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "not_modified": self.not_modified,
+            "invalidated": self.invalidated,
+        }
+
+
+cache = ResponseCache(_make_backend(), ttl=settings.CACHE_TTL_S)
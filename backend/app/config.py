@@ -1,9 +1,109 @@
+from typing import Dict, List, Optional
+
 from pydantic_settings import BaseSettings
 
 
 class Settings(BaseSettings):
     MONGODB_URI: str
     DATABASE_NAME: str = "vapeDB"
+    ENSURE_INDEXES_ON_STARTUP: bool = True  # also the readings collection; else `python -m app.migrations indexes`
+
+    # Inference
+    INFERENCE_MODE: str = "auto"  # auto | native | numpy | pipeline
+    PREDICTION_THRESHOLD: float = 0.5
+    INFERENCE_BATCH_MAX_SIZE: int = 64
+    INFERENCE_BATCH_WINDOW_MS: float = 5.0
+    INFERENCE_EXECUTOR: str = "thread"  # thread | process | inline
+    INFERENCE_WORKERS: int = 2
+    INFERENCE_MAX_PENDING: int = 1024
+    INFERENCE_RETRY_AFTER_S: int = 1
+
+    # Model registry (default: backend/models/registry)
+    MODEL_REGISTRY_DIR: Optional[str] = None
+    MODEL_WATCH_INTERVAL_S: float = 5.0  # 0 disables the file watcher
+    MODEL_PRELOAD: bool = True  # load at startup instead of on the first scoring request
+    MODEL_ADMIN_TOKEN: Optional[str] = None  # required as X-Admin-Token; unset disables reload/activate
+
+    # Shadow scoring: registry versions scored beside the primary on a
+    # sample of live rows, results in SHADOW_COLLECTION
+    SHADOW_MODELS: List[str] = []
+    SHADOW_SAMPLE_RATE: float = 0.1
+    SHADOW_MAX_PENDING: int = 8
+    SHADOW_WORKERS: int = 1
+    SHADOW_COLLECTION: str = "shadow_predictions"
+    SHADOW_RETENTION_DAYS: int = 14
+
+    # Ingest
+    SENSOR_BATCH_MAX_ROWS: int = 1000
+    SENSOR_EXTRA_FIELDS: str = "keep"  # keep | drop | reject
+    # Model feature -> device field it is read from when not sent directly
+    SENSOR_FEATURE_MAP: Dict[str, str] = {"volume_spike": "sound_level"}
+    SENSOR_REQUIRED_FEATURES: List[str] = ["humidity", "pm25"]
+    SENSOR_MISSING_VALUE: float = -999.0
+    FEATURE_WINDOWS_ENABLED: bool = True
+    FEATURE_WINDOW_SIZE: int = 60
+    FEATURE_EWMA_ALPHA: float = 0.1
+    FEATURE_WINDOW_MAX_DEVICES: int = 10000
+
+    # Write-behind ingest (202 + background insert_many)
+    WRITE_BEHIND_ENABLED: bool = False
+    WRITE_BEHIND_MAX_QUEUE: int = 10000
+    WRITE_BEHIND_BATCH: int = 500
+    WRITE_BEHIND_FLUSH_MS: float = 200.0
+    WRITE_BEHIND_SPILL_PATH: str = "write_behind_spill.ndjson"
+
+    # MQTT ingestion gateway (needs paho-mqtt)
+    MQTT_ENABLED: bool = False
+    MQTT_HOST: str = "localhost"
+    MQTT_PORT: int = 1883
+    MQTT_USERNAME: Optional[str] = None
+    MQTT_PASSWORD: Optional[str] = None
+    MQTT_CLIENT_ID: str = "vapeguard-ingest"  # stable across restarts, unique per gateway instance
+    MQTT_SHARED_GROUP: str = "vapeguard-ingest"  # shared subscription group; "" subscribes directly
+    MQTT_MAX_QUEUED: int = 2000
+    MQTT_TOPIC_PREFIX: str = "vapeguard"
+    MQTT_QOS: int = 1
+    MQTT_KEEPALIVE_S: int = 60
+    MQTT_RECONNECT_MAX_S: int = 30
+    MQTT_BATCH_MAX_SIZE: int = 200
+    MQTT_BATCH_WINDOW_MS: float = 250.0
+    MQTT_RETRY_S: float = 1.0
+    MQTT_MAX_RETRIES: int = 10  # transient failures, backing off up to MQTT_RECONNECT_MAX_S
+    MQTT_DEAD_LETTER_PREFIX: str = "vapeguard-dead-letter"  # "" acks and drops failed messages
+    MQTT_PUBLISH_PREDICTIONS: bool = True
+
+    # Incident coalescing
+    INCIDENTS_ENABLED: bool = False  # per-process state: one ingest process per device
+    INCIDENT_ENTER_CONFIDENCE: float = 0.5
+    INCIDENT_EXIT_CONFIDENCE: float = 0.3
+    INCIDENT_CONFIRM_SAMPLES: int = 2
+    INCIDENT_COOLDOWN_S: float = 60.0
+    INCIDENT_SWEEP_INTERVAL_S: float = 10.0  # closes incidents of devices that went quiet
+
+    # Storage
+    STORAGE_MODE: str = "events"  # events | timeseries
+    READINGS_COLLECTION: str = "readings"
+    READINGS_RETENTION_DAYS: int = 30
+
+    # Observability
+    METRICS_LOOP_LAG_INTERVAL_S: float = 0.5
+    HEALTH_MONGO_TIMEOUT_S: float = 2.0
+
+    # Live stream
+    STREAM_QUEUE_SIZE: int = 100
+    STREAM_HEARTBEAT_S: float = 15.0
+
+    # Read cache
+    CACHE_BACKEND: str = "memory"  # memory | redis | none
+    CACHE_REDIS_URL: str = "redis://localhost:6379/0"
+    CACHE_TTL_S: float = 5.0
+    CACHE_MAX_ENTRIES: int = 1024
+    CACHE_INVALIDATE_ALL_DEVICE_VIEWS: bool = False  # False: "*" views expire after CACHE_TTL_S
+
+    # Bulk export
+    EXPORT_BATCH_SIZE: int = 5000  # cursor batch and encoding chunk (rows)
+    EXPORT_PARQUET_ROW_GROUP: int = 50000
+
     class Config:
         env_file = ".env"
 
@@ -1,5 +1,82 @@
-from motor.motor_asyncio import AsyncIOMotorClient
+import logging
+from typing import Set
+from pymongo import ASCENDING, DESCENDING, IndexModel
 from app.config import settings
+from app.metrics import MongoPoolListener
 
-client = AsyncIOMotorClient(settings.MONGODB_URI)
-db = client[settings.DATABASE_NAME]
+logger = logging.getLogger(__name__)
+
+_client = None
+_database = None
+
+
+def get_client():
+    """
+    The Motor client, created on first use. Construction resolves
+    mongodb+srv DNS records and starts monitor threads, which cold starts
+    of routes that never touch MongoDB shouldn't pay for.
+    """
+    global _client
+    if _client is None:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        _client = AsyncIOMotorClient(settings.MONGODB_URI, event_listeners=[MongoPoolListener()])
+    return _client
+
+
+def get_database():
+    global _database
+    if _database is None:
+        _database = get_client()[settings.DATABASE_NAME]
+    return _database
+
+
+class _Deferred:
+    """Stands in for a Motor object until something actually uses it."""
+
+    def __init__(self, resolve):
+        self._resolve = resolve
+
+    def __getattr__(self, name):
+        return getattr(self._resolve(), name)
+
+    def __getitem__(self, name):
+        return self._resolve()[name]
+
+
+# Modules keep doing `from app.database import db`
+client = _Deferred(get_client)
+db = _Deferred(get_database)
+
+# Indexes the routers rely on, per collection
+INDEXES = {
+    "events": [
+        # Keyset pagination and exports sort on (timestamp, _id); these also
+        # serve plain timestamp sorts, replacing the former timestamp-only
+        # indexes (drop device_id_timestamp and timestamp on old deployments)
+        IndexModel([("device_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)],
+                   name="device_id_timestamp_id"),
+        IndexModel([("timestamp", DESCENDING), ("_id", DESCENDING)], name="timestamp_id"),
+        IndexModel([("device_id", ASCENDING), ("verified", ASCENDING)], name="device_id_verified"),
+    ],
+    settings.SHADOW_COLLECTION: [
+        IndexModel([("scored_at", ASCENDING)], name="scored_at_ttl",
+                   expireAfterSeconds=settings.SHADOW_RETENTION_DAYS * 86400),
+    ],
+}
+
+
+async def index_names(collection) -> Set[str]:
+    """Names of the indexes that exist on a collection."""
+    return {index["name"] async for index in collection.list_indexes()}
+
+
+async def ensure_indexes():
+    """Create the indexes in INDEXES and check that they all exist."""
+    missing = []
+    for collection, indexes in INDEXES.items():
+        await db[collection].create_indexes(indexes)
+        existing = await index_names(db[collection])
+        missing += [f"{collection}.{index.document['name']}" for index in indexes
+                    if index.document["name"] not in existing]
+    if missing:
+        raise RuntimeError(f"Missing indexes: {', '.join(missing)}")
@@ -0,0 +1,171 @@
+"""
+Per-device summary documents kept in the `device_stats` collection.
+
+The ingest paths update them incrementally so device listings never have
+to scan `events`. `python -m app.device_stats rebuild` recomputes them
+from the raw events.
+"""
+import asyncio
+import logging
+import sys
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional
+
+from pymongo import UpdateOne, ReplaceOne
+
+from app.database import db
+from app.timeutils import parse_timestamp
+
+logger = logging.getLogger(__name__)
+
+# Events per hour are kept under hourly.<YYYY-MM-DDTHH>
+HOUR_FORMAT = "%Y-%m-%dT%H"
+HOURLY_RETENTION = 48
+# Events without a device_id are counted under "unknown", as on ingest
+DEVICE_ID = {"$addFields": {"device_id": {
+    "$cond": [{"$eq": [{"$ifNull": ["$device_id", ""]}, ""]}, "unknown", "$device_id"],
+}}}
+
+
+def hour_key(timestamp) -> str:
+    """Bucket key for an event timestamp (falls back to the current hour)."""
+    return (parse_timestamp(timestamp) or datetime.utcnow()).strftime(HOUR_FORMAT)
+
+
+def _prune_hours(device_id: str, now: datetime) -> UpdateOne:
+    # Drop every bucket older than the retention window, however old (a
+    # device may have been offline for days); keys sort chronologically
+    cutoff = (now - timedelta(hours=HOURLY_RETENTION)).strftime(HOUR_FORMAT)
+    return UpdateOne({"_id": device_id}, [{"$set": {"hourly": {"$arrayToObject": {"$filter": {
+        "input": {"$objectToArray": {"$ifNull": ["$hourly", {}]}},
+        "cond": {"$gte": ["$$this.k", cutoff]},
+    }}}}}])
+
+
+def _updates_for(doc: dict, now: datetime) -> List[UpdateOne]:
+    device_id = doc.get("device_id") or "unknown"
+    timestamp = doc.get("timestamp")
+    update = {
+        "$inc": {
+            "total_events": 1,
+            "verified_events": 1 if doc.get("verified") else 0,
+            f"hourly.{hour_key(timestamp)}": 1,
+        },
+        "$max": {"last_seen": timestamp},
+        "$setOnInsert": {"device_id": device_id},
+    }
+    return [
+        UpdateOne({"_id": device_id}, update, upsert=True),
+        # Only the newest event (the one that set last_seen) becomes latest
+        UpdateOne(
+            {"_id": device_id, "last_seen": timestamp},
+            {"$set": {"last_location": doc.get("location"), "latest_event": doc}},
+        ),
+    ]
+
+
+async def record_events(docs: Iterable[dict]):
+    """Fold freshly inserted events into their devices' summaries."""
+    now = datetime.utcnow()
+    docs = list(docs)
+    ops = [op for doc in docs for op in _updates_for(doc, now)]
+    if not ops:
+        return
+    ops += [_prune_hours(device_id, now) for device_id in {doc.get("device_id") or "unknown" for doc in docs}]
+    try:
+        await db.device_stats.bulk_write(ops, ordered=True)
+    except Exception:
+        # The events are already stored; a rebuild will reconcile the counters
+        logger.exception("Failed to update device_stats")
+
+
+async def record_verification(event: dict, verified: bool):
+    """Adjust counters after an event's verified flag changed."""
+    if bool(event.get("verified")) == verified:
+        return
+    device_id = event.get("device_id") or "unknown"
+    try:
+        await db.device_stats.bulk_write([
+            UpdateOne({"_id": device_id}, {"$inc": {"verified_events": 1 if verified else -1}}),
+            UpdateOne(
+                {"_id": device_id, "latest_event._id": event["_id"]},
+                {"$set": {"latest_event.verified": verified}},
+            ),
+        ])
+    except Exception:
+        logger.exception("Failed to update device_stats")
+
+
+def recent_count(stats: dict, hours: int, now: Optional[datetime] = None) -> int:
+    """Sum the hourly buckets covering the last `hours` hours."""
+    now = now or datetime.utcnow()
+    since = (now - timedelta(hours=hours)).strftime(HOUR_FORMAT)
+    return sum(n for key, n in (stats.get("hourly") or {}).items() if key >= since)
+
+
+def summarize(stats: dict) -> dict:
+    latest_event = stats.get("latest_event")
+    summary = {
+        "device_id": stats["device_id"],
+        "total_events": stats.get("total_events", 0),
+        "recent_events": recent_count(stats, 24),
+        "verified_events": stats.get("verified_events", 0),
+        "last_seen": stats.get("last_seen"),
+        "last_location": stats.get("last_location"),
+    }
+    if latest_event:
+        summary["latest_event"] = {**latest_event, "_id": str(latest_event["_id"])}
+    return summary
+
+
+async def rebuild() -> int:
+    """Recompute every device summary from the events collection."""
+    since = datetime.utcnow() - timedelta(hours=HOURLY_RETENTION)
+    totals = db.events.aggregate([
+        DEVICE_ID,
+        {"$sort": {"device_id": 1, "timestamp": -1}},
+        {"$group": {
+            "_id": "$device_id",
+            "total_events": {"$sum": 1},
+            "verified_events": {"$sum": {"$cond": [{"$eq": ["$verified", True]}, 1, 0]}},
+            "latest_event": {"$first": "$$ROOT"},
+        }},
+    ], allowDiskUse=True)
+    hourly = db.events.aggregate([
+        {"$match": {"timestamp": {"$gte": since}}},
+        DEVICE_ID,
+        {"$group": {
+            "_id": {"device_id": "$device_id", "hour": {"$dateToString": {"date": "$timestamp", "format": HOUR_FORMAT}}},
+            "count": {"$sum": 1},
+        }},
+    ])
+
+    buckets = {}
+    async for row in hourly:
+        buckets.setdefault(row["_id"]["device_id"], {})[row["_id"]["hour"]] = row["count"]
+
+    ops, seen = [], []
+    async for group in totals:
+        device_id = group["_id"]
+        latest_event = group["latest_event"]
+        seen.append(device_id)
+        ops.append(ReplaceOne({"_id": device_id}, {
+            "device_id": device_id,
+            "total_events": group["total_events"],
+            "verified_events": group["verified_events"],
+            "last_seen": latest_event.get("timestamp"),
+            "last_location": latest_event.get("location"),
+            "latest_event": latest_event,
+            "hourly": buckets.get(device_id, {}),
+        }, upsert=True))
+    if ops:
+        await db.device_stats.bulk_write(ops, ordered=False)
+    await db.device_stats.delete_many({"_id": {"$nin": seen}})
+    return len(seen)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["rebuild"]:
+        sys.exit("usage: python -m app.device_stats rebuild")
+    count = asyncio.run(rebuild())
+    print(f"Rebuilt device_stats for {count} devices")
@@ -0,0 +1,88 @@
+import asyncio
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Optional
+
+from app.config import settings
+
+
+class InferenceSaturated(Exception):
+    """Raised when the inference path has more pending work than it accepts."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Inference queue is full")
+        self.retry_after = retry_after
+
+
+def _preload_model():
+    # Runs once in every worker process so the first batch doesn't pay for it
+    from app import inference
+    inference.current()
+
+
+class InferenceExecutor:
+    """
+    Runs CPU-bound scoring off the event loop on a thread or process pool.
+    At most `max_in_flight` calls are handed to the pool at once; the rest
+    wait their turn.
+    """
+
+    def __init__(self, kind: str, workers: int, max_in_flight: int):
+        self.kind = kind
+        self.workers = max(1, workers)
+        self.max_in_flight = max(1, max_in_flight)
+        self._pool: Optional[Executor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._started = time.monotonic()
+        self.in_flight = 0
+        self.completed = 0
+        self.busy_seconds = 0.0
+
+    def _ensure_pool(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._slots = asyncio.Semaphore(self.max_in_flight)
+        if self._pool is None and self.kind != "inline":
+            if self.kind == "process":
+                self._pool = ProcessPoolExecutor(self.workers, initializer=_preload_model)
+            else:
+                self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix="inference")
+
+    async def run(self, fn: Callable, *args):
+        self._ensure_pool()
+        async with self._slots:
+            self.in_flight += 1
+            started = time.perf_counter()
+            try:
+                if self._pool is None:
+                    return fn(*args)
+                return await self._loop.run_in_executor(self._pool, fn, *args)
+            finally:
+                self.in_flight -= 1
+                self.completed += 1
+                self.busy_seconds += time.perf_counter() - started
+
+    def stats(self) -> dict:
+        uptime = time.monotonic() - self._started
+        return {
+            "kind": self.kind,
+            "workers": self.workers,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "completed": self.completed,
+            "utilization": min(1.0, self.busy_seconds / (self.workers * uptime)) if uptime else 0.0,
+        }
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+
+executor = InferenceExecutor(
+    kind=settings.INFERENCE_EXECUTOR,
+    workers=settings.INFERENCE_WORKERS,
+    max_in_flight=settings.INFERENCE_WORKERS * 2,
+)
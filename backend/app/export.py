@@ -0,0 +1,182 @@
+"""
+Streaming bulk export of events and readings.
+
+Documents come off a Motor cursor EXPORT_BATCH_SIZE at a time and are
+encoded one chunk at a time, so memory stays flat however large the
+export is. NDJSON and CSV chunks are yielded as they are encoded;
+Parquet (needs pyarrow) is written as one row group per
+EXPORT_PARQUET_ROW_GROUP rows, each flushed to the response as soon as
+it is complete.
+
+CSV and Parquet need fixed columns, known before the first row: the
+requested `fields`, or else DEFAULT_COLUMNS (identity, every sensor
+field, the rolling features and the prediction), with fixed types.
+Other stored keys (extra device fields) are only exported when listed in
+`fields`, and as text. Nested values (incident state, feedback ids) are
+written as JSON text.
+"""
+import asyncio
+import csv
+import io
+from datetime import datetime
+from typing import Any, AsyncIterator, List, Optional
+
+import orjson
+from bson import ObjectId
+
+from app.config import settings
+from app.features import TEMPORAL_FEATURES
+from app.schemas import SensorReading
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+TEXT_COLUMNS = ["_id", "device_id", "location", "sensor_type", "predicted_type", "model_version"]
+# Everything a reading, its features and its prediction can store; the
+# numeric ones are float64 in Parquet
+DEFAULT_COLUMNS = list(dict.fromkeys([
+    "_id", "device_id", "location", "timestamp", "sensor_type",
+    *SensorReading.model_fields, *settings.SENSOR_FEATURE_MAP, *TEMPORAL_FEATURES,
+    "predicted_type", "confidence", "model_version", "verified", "incident",
+]))
+
+
+def columns(fields: Optional[List[str]]) -> List[str]:
+    """Exported columns for CSV and Parquet: `_id` plus `fields`, or DEFAULT_COLUMNS."""
+    if not fields:
+        return list(DEFAULT_COLUMNS)
+    return ["_id", *(name for name in fields if name != "_id")]
+
+
+def _default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError
+
+
+def _flat(value: Any) -> Any:
+    """A scalar for CSV/Parquet cells."""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (dict, list)):
+        return orjson.dumps(value, default=_default).decode()
+    return value
+
+
+async def _chunks(cursor, size: int) -> AsyncIterator[List[dict]]:
+    chunk = []
+    async for doc in cursor:
+        chunk.append(doc)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+async def ndjson(cursor, fields: Optional[List[str]] = None) -> AsyncIterator[bytes]:
+    async for chunk in _chunks(cursor, settings.EXPORT_BATCH_SIZE):
+        yield b"".join(orjson.dumps(doc, default=_default) + b"\n" for doc in chunk)
+
+
+async def csv_rows(cursor, fields: Optional[List[str]] = None) -> AsyncIterator[bytes]:
+    names = columns(fields)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(names)
+    async for chunk in _chunks(cursor, settings.EXPORT_BATCH_SIZE):
+        for doc in chunk:
+            row = []
+            for name in names:
+                value = _flat(doc.get(name))
+                row.append(value.isoformat() if isinstance(value, datetime) else value)
+            writer.writerow(row)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        # Header only: nothing matched
+        yield buffer.getvalue().encode()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands its bytes back to the response as they are produced."""
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._buffer += data
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+def _arrow_type(pa, name: str):
+    if name == "timestamp":
+        return pa.timestamp("ms")
+    if name == "verified":
+        return pa.bool_()
+    if name in DEFAULT_COLUMNS and name not in TEXT_COLUMNS and name != "incident":
+        return pa.float64()
+    return pa.string()
+
+
+def _coerce(value: Any, kind: str) -> Any:
+    # Cast a cell to its column's type; mismatches become null
+    if value is None:
+        return None
+    if kind == "double":
+        return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+    if kind == "bool":
+        return value if isinstance(value, bool) else None
+    if kind.startswith("timestamp"):
+        return value if isinstance(value, datetime) else None
+    return value if isinstance(value, str) else str(value)
+
+
+async def parquet(cursor, fields: Optional[List[str]] = None) -> AsyncIterator[bytes]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sink = _ChunkSink()
+    schema = pa.schema([(name, _arrow_type(pa, name)) for name in columns(fields)])
+    writer = pq.ParquetWriter(sink, schema, compression="snappy")
+    group: List[dict] = []
+
+    def write_group():
+        rows = {field.name: [] for field in schema}
+        for doc in group:
+            for field in schema:
+                rows[field.name].append(_coerce(_flat(doc.get(field.name)), str(field.type)))
+        writer.write_table(pa.Table.from_pydict(rows, schema=schema), row_group_size=len(group))
+        group.clear()
+
+    async for chunk in _chunks(cursor, settings.EXPORT_BATCH_SIZE):
+        group.extend(chunk)
+        if len(group) >= settings.EXPORT_PARQUET_ROW_GROUP:
+            # Building and compressing a row group is too slow for the event loop
+            await asyncio.to_thread(write_group)
+            yield sink.drain()
+    if group:
+        await asyncio.to_thread(write_group)
+    writer.close()
+    yield sink.drain()
+
+
+ENCODERS = {"ndjson": ndjson, "csv": csv_rows, "parquet": parquet}
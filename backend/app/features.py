@@ -0,0 +1,133 @@
+"""
+Rolling per-device features computed incrementally from the live stream.
+
+Each device keeps a fixed-size, array-backed ring buffer of its last
+readings plus running EWMA statistics, so adding a reading is O(1) and
+memory is bounded by `window * max_devices`. The same code is used by
+train_model.py so training and serving see identical features.
+"""
+import math
+from collections import OrderedDict
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+# Signals tracked per device, in ring buffer column order
+SIGNALS = ["pm25", "sound_level", "gas_resistance"]
+# Signals that get an EWMA baseline, delta and z-score
+BASELINE_SIGNALS = ["pm25", "sound_level"]
+
+TEMPORAL_FEATURES = [
+    *(f"{name}_{suffix}" for name in BASELINE_SIGNALS for suffix in ("ewma", "delta", "zscore")),
+    "gas_resistance_slope",
+]
+
+
+def _signal(reading: dict, name: str) -> float:
+    value = reading.get(name)
+    try:
+        return float(value) if value is not None else math.nan
+    except (TypeError, ValueError):
+        return math.nan
+
+
+class DeviceWindow:
+    def __init__(self, size: int, alpha: float):
+        self.size = size
+        self.alpha = alpha
+        self.buffer = np.full((size, len(SIGNALS)), np.nan)
+        self.count = 0
+        self.head = 0
+        self.mean = dict.fromkeys(BASELINE_SIGNALS, math.nan)
+        self.var = dict.fromkeys(BASELINE_SIGNALS, 0.0)
+        # Running sums for the least-squares slope of gas_resistance over
+        # the window (x = position in window, oldest = 0)
+        self._n = 0
+        self._sum_y = 0.0
+        self._sum_xy = 0.0
+
+    def update(self, reading: dict) -> Dict[str, float]:
+        """Add one reading and return its rolling features."""
+        values = [_signal(reading, name) for name in SIGNALS]
+        features = {}
+
+        for name in BASELINE_SIGNALS:
+            x = values[SIGNALS.index(name)]
+            mean, var = self.mean[name], self.var[name]
+            if math.isnan(x):
+                delta = zscore = math.nan
+            elif math.isnan(mean):
+                # First sample seeds the baseline
+                self.mean[name] = x
+                delta, zscore = 0.0, 0.0
+            else:
+                # Compare against the baseline *before* this reading
+                delta = x - mean
+                zscore = delta / math.sqrt(var) if var > 0 else 0.0
+                increment = self.alpha * delta
+                self.mean[name] = mean + increment
+                self.var[name] = (1 - self.alpha) * (var + delta * increment)
+            features[f"{name}_ewma"] = self.mean[name]
+            features[f"{name}_delta"] = delta
+            features[f"{name}_zscore"] = zscore
+
+        features["gas_resistance_slope"] = self._push_gas(values[SIGNALS.index("gas_resistance")])
+
+        self.buffer[self.head] = values
+        self.head = (self.head + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+        return features
+
+    def _push_gas(self, y: float) -> float:
+        if math.isnan(y):
+            # Gaps break the regression; start again from the next sample
+            self._n, self._sum_y, self._sum_xy = 0, 0.0, 0.0
+            return math.nan
+        column = SIGNALS.index("gas_resistance")
+        if self._n < self.size:
+            self._sum_xy += self._n * y
+            self._sum_y += y
+            self._n += 1
+        else:
+            # Slide by one: every x shifts down, the oldest drops out
+            oldest = float(self.buffer[self.head, column])
+            self._sum_xy += oldest - self._sum_y + (self._n - 1) * y
+            self._sum_y += y - oldest
+        n = self._n
+        if n < 2:
+            return math.nan
+        sum_x = n * (n - 1) / 2
+        sum_xx = (n - 1) * n * (2 * n - 1) / 6
+        return (n * self._sum_xy - sum_x * self._sum_y) / (n * sum_xx - sum_x * sum_x)
+
+
+class WindowStore:
+    """Per-device windows, evicting the least recently seen device."""
+
+    def __init__(self, size: int = 60, alpha: float = 0.1, max_devices: int = 10000):
+        self.size = size
+        self.alpha = alpha
+        self.max_devices = max_devices
+        self.windows: "OrderedDict[str, DeviceWindow]" = OrderedDict()
+
+    def update(self, device_id: str, reading: dict) -> Dict[str, float]:
+        window = self.windows.get(device_id)
+        if window is None:
+            window = self.windows[device_id] = DeviceWindow(self.size, self.alpha)
+            if len(self.windows) > self.max_devices:
+                self.windows.popitem(last=False)
+        else:
+            self.windows.move_to_end(device_id)
+        return window.update(reading)
+
+    def enrich(self, reading: dict) -> dict:
+        """Add the rolling features to a reading in place (None where undefined)."""
+        for name, value in self.update(reading.get("device_id") or "unknown", reading).items():
+            reading[name] = None if math.isnan(value) else value
+        return reading
+
+
+def rolling_features(readings: Iterable[dict], size: int = 60, alpha: float = 0.1) -> List[Dict[str, float]]:
+    """Replay time-ordered readings through fresh windows (for training)."""
+    store = WindowStore(size, alpha, max_devices=math.inf)
+    return [store.update(r.get("device_id") or "unknown", r) for r in readings]
@@ -0,0 +1,82 @@
+"""
+Compact binary frames for constrained devices (POST /api/sensors/frame).
+
+A frame carries one or more readings from a single device. All values
+are little-endian (the ESP32's native order), so the firmware can fill
+the buffer with memcpy:
+
+    header   u8  version (FRAME_VERSION)
+             u8  number of readings
+             u8  device_id length, then that many UTF-8 bytes
+             u8  location length, then that many UTF-8 bytes
+    reading  u32 age_ms: how long before sending the reading was taken
+             f32 gas_resistance, temperature, humidity, pressure,
+                 pm25, pm10, sound_level (NaN = not available)
+             i8  wifi_rssi
+
+A frame with six readings is about 240 bytes, versus ~400 bytes of
+JSON for each reading.
+"""
+import math
+import struct
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+FRAME_VERSION = 1
+MEDIA_TYPE = "application/vnd.vapeguard.frame"
+
+HEADER = struct.Struct("<BB")
+READING = struct.Struct("<I7fb")
+READING_FIELDS = ("gas_resistance", "temperature", "humidity", "pressure", "pm25", "pm10", "sound_level")
+
+
+def _string(body: bytes, offset: int) -> Tuple[str, int]:
+    if offset >= len(body):
+        raise ValueError("truncated frame header")
+    length = body[offset]
+    end = offset + 1 + length
+    if end > len(body):
+        raise ValueError("truncated frame header")
+    return body[offset + 1:end].decode("utf-8"), end
+
+
+def decode_frame(body: bytes, received_at: Optional[datetime] = None) -> List[dict]:
+    """Decode a frame into reading dicts ready for SensorReading validation."""
+    if len(body) < HEADER.size:
+        raise ValueError("frame too short")
+    version, count = HEADER.unpack_from(body)
+    if version != FRAME_VERSION:
+        raise ValueError(f"unsupported frame version {version}")
+    device_id, offset = _string(body, HEADER.size)
+    location, offset = _string(body, offset)
+    if len(body) != offset + count * READING.size:
+        raise ValueError(f"expected {count} readings of {READING.size} bytes")
+
+    received_at = received_at or datetime.utcnow()
+    readings = []
+    for age_ms, *values, rssi in READING.iter_unpack(body[offset:]):
+        reading = {"device_id": device_id, "timestamp": received_at - timedelta(milliseconds=age_ms)}
+        if location:
+            reading["location"] = location
+        for name, value in zip(READING_FIELDS, values):
+            if not math.isnan(value):
+                reading[name] = value
+        reading["wifi_rssi"] = rssi
+        readings.append(reading)
+    return readings
+
+
+def encode_frame(device_id: str, readings: List[dict], location: str = "") -> bytes:
+    """Build a frame (used by the simulator and for testing firmware output)."""
+    parts = [HEADER.pack(FRAME_VERSION, len(readings))]
+    for text in (device_id, location):
+        raw = text.encode("utf-8")
+        parts.append(bytes([len(raw)]) + raw)
+    for reading in readings:
+        values = [reading.get(name) for name in READING_FIELDS]
+        parts.append(READING.pack(
+            int(reading.get("age_ms", 0)),
+            *(math.nan if v is None else v for v in values),
+            int(reading.get("wifi_rssi", 0)),
+        ))
+    return b"".join(parts)
@@ -0,0 +1,223 @@
+"""
+Per-device incident tracking on the ingest path.
+
+Consecutive positive readings from a device are merged into one incident
+document in `events` that is updated in place (peak confidence, sample
+count, duration) instead of inserting an event per reading:
+
+    idle --enter--> suspected --confirm--> active --exit--> cooldown --timeout--> closed
+                        |                     ^                 |
+                        |                     +----re-enter-----+
+                        +--exit--> dismissed
+
+A reading counts as positive above INCIDENT_ENTER_CONFIDENCE when idle
+and above the lower INCIDENT_EXIT_CONFIDENCE once an incident is open.
+An incident needs INCIDENT_CONFIRM_SAMPLES consecutive positives to
+become active; one that ends before that is dismissed, and its document
+keeps `incident.confirmed: false` so it isn't mistaken for a real one.
+When more than `max_devices` devices have an open incident, the least
+recently seen is closed, and expire() (run every
+INCIDENT_SWEEP_INTERVAL_S) closes the incidents of devices that have
+sent nothing at all for INCIDENT_COOLDOWN_S, which would otherwise stay
+open for good.
+
+Tracker state lives in this process. Several API workers, serverless
+instances or MQTT gateways sharing a subscription each see only part of
+a device's readings and split its incidents; enable INCIDENTS_ENABLED
+only where one process ingests every reading of a device.
+"""
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import List, Optional
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from app.config import settings
+
+IDLE, SUSPECTED, ACTIVE, COOLDOWN, CLOSED = "idle", "suspected", "active", "cooldown", "closed"
+DISMISSED = "dismissed"
+
+
+class Observation:
+    """What the tracker decided for one reading."""
+
+    def __init__(self, incident: "DeviceIncident", state: str, merged: bool, opened: bool = False,
+                 state_changed: bool = False):
+        self.incident_id = incident.incident_id
+        self.started_at = incident.started_at
+        self.confirmed = incident.confirmed
+        self.state = state
+        # The reading was folded into the incident instead of being stored
+        self.merged = merged
+        self.opened = opened
+        self.state_changed = state_changed
+
+
+class DeviceIncident:
+    def __init__(self, device_id: str, started_at: datetime):
+        self.incident_id = ObjectId()
+        self.device_id = device_id
+        self.state = SUSPECTED
+        self.started_at = started_at
+        self.last_positive = started_at
+        self.cooldown_since: Optional[datetime] = None
+        self.consecutive = 0
+        # Has been active at least once
+        self.confirmed = False
+        # When the device last sent a reading (wall clock, for expire())
+        self.touched = time.monotonic()
+
+
+class IncidentTracker:
+    def __init__(self, enter: float, exit: float, confirm_samples: int, cooldown_s: float,
+                 max_devices: int = 10000):
+        self.enter = enter
+        self.exit = exit
+        self.confirm_samples = max(1, confirm_samples)
+        self.cooldown_s = cooldown_s
+        self.max_devices = max_devices
+        self.open: "OrderedDict[str, DeviceIncident]" = OrderedDict()
+        # Incidents pushed out by max_devices or expired, still to be closed in storage
+        self.evicted: List[DeviceIncident] = []
+
+    def observe(self, doc: dict) -> Optional[Observation]:
+        """
+        Advance the device's state machine with a scored reading. Returns
+        None when the reading has nothing to do with an incident.
+        """
+        device_id = doc.get("device_id") or "unknown"
+        confidence = doc.get("confidence") or 0.0
+        now = doc.get("timestamp") or datetime.utcnow()
+        incident = self.open.get(device_id)
+
+        if incident is None:
+            if confidence < self.enter:
+                return None
+            incident = self.open[device_id] = DeviceIncident(device_id, now)
+            if len(self.open) > self.max_devices:
+                self.evicted.append(self.open.popitem(last=False)[1])
+            return self._positive(incident, now, opened=True)
+
+        self.open.move_to_end(device_id)
+        incident.touched = time.monotonic()
+        if confidence >= self.exit:
+            return self._positive(incident, now)
+
+        # Negative reading: dismiss an unconfirmed incident; otherwise
+        # cool down, then close once quiet long enough
+        if not incident.confirmed:
+            del self.open[device_id]
+            return Observation(incident, DISMISSED, merged=False, state_changed=True)
+        if incident.state != COOLDOWN:
+            incident.state = COOLDOWN
+            incident.cooldown_since = now
+            incident.consecutive = 0
+            return Observation(incident, COOLDOWN, merged=False, state_changed=True)
+        if (now - incident.cooldown_since).total_seconds() >= self.cooldown_s:
+            del self.open[device_id]
+            return Observation(incident, CLOSED, merged=False, state_changed=True)
+        return None
+
+    def expire(self):
+        """Move the incidents of devices quiet for cooldown_s to `evicted`."""
+        cutoff = time.monotonic() - self.cooldown_s
+        # `open` is kept in least recently seen order
+        while self.open:
+            device_id, incident = next(iter(self.open.items()))
+            if incident.touched > cutoff:
+                break
+            del self.open[device_id]
+            self.evicted.append(incident)
+
+    def _positive(self, incident: DeviceIncident, now: datetime, opened: bool = False) -> Observation:
+        previous = incident.state
+        incident.consecutive += 1
+        incident.last_positive = max(incident.last_positive, now)
+        if previous == COOLDOWN or incident.consecutive >= self.confirm_samples:
+            incident.state = ACTIVE
+            incident.confirmed = True
+        return Observation(incident, incident.state, merged=True, opened=opened,
+                           state_changed=opened or incident.state != previous)
+
+
+# Fields maintained by the tracker rather than copied from the first reading
+TRACKED_FIELDS = ("_id", "confidence", "incident")
+
+
+def incident_document(doc: dict, observation: Observation) -> dict:
+    """The event document an incident starts out as."""
+    return {
+        **doc,
+        "_id": observation.incident_id,
+        "incident": {
+            "state": observation.state,
+            "started_at": observation.started_at,
+            "last_seen": doc["timestamp"],
+            "peak_confidence": doc.get("confidence"),
+            "sample_count": 1,
+            "duration_s": 0.0,
+            "confirmed": observation.confirmed,
+        },
+    }
+
+
+def incident_write(doc: dict, observation: Observation) -> UpdateOne:
+    """
+    Fold a reading into its incident document. Merges are upserts that
+    commute, so it doesn't matter which reading's write lands first.
+    """
+    if not observation.merged:
+        fields = {"incident.state": observation.state}
+        if observation.state in (CLOSED, DISMISSED):
+            fields["incident.ended_at"] = doc["timestamp"]
+        return UpdateOne({"_id": observation.incident_id}, {"$set": fields})
+    # Confirmation only ever goes from false to true
+    confirmed = {"incident.confirmed": observation.confirmed}
+    return UpdateOne(
+        {"_id": observation.incident_id},
+        {
+            "$setOnInsert": {
+                **{k: v for k, v in doc.items() if k not in TRACKED_FIELDS},
+                "incident.started_at": observation.started_at,
+                **({} if observation.confirmed else confirmed),
+            },
+            "$max": {
+                "confidence": doc.get("confidence"),
+                "incident.peak_confidence": doc.get("confidence"),
+                "incident.last_seen": doc["timestamp"],
+                "incident.duration_s": (doc["timestamp"] - observation.started_at).total_seconds(),
+            },
+            "$inc": {"incident.sample_count": 1},
+            "$set": {"incident.state": observation.state, **(confirmed if observation.confirmed else {})},
+        },
+        upsert=True,
+    )
+
+
+def ended_state(incident: DeviceIncident) -> str:
+    return CLOSED if incident.confirmed else DISMISSED
+
+
+def eviction_writes(tracker: "IncidentTracker") -> List[UpdateOne]:
+    """Close (or dismiss) the incidents the tracker evicted or expired."""
+    writes = []
+    while tracker.evicted:
+        incident = tracker.evicted.pop()
+        writes.append(UpdateOne(
+            {"_id": incident.incident_id},
+            {"$set": {
+                "incident.state": ended_state(incident),
+                "incident.ended_at": incident.last_positive,
+            }},
+        ))
+    return writes
+
+
+tracker = IncidentTracker(
+    enter=settings.INCIDENT_ENTER_CONFIDENCE,
+    exit=settings.INCIDENT_EXIT_CONFIDENCE,
+    confirm_samples=settings.INCIDENT_CONFIRM_SAMPLES,
+    cooldown_s=settings.INCIDENT_COOLDOWN_S,
+)
@@ -1,21 +1,437 @@
-import joblib
-import pandas as pd
+"""
+Model loading and scoring.
+
+Models live in a registry directory, one subdirectory per version
+(model.ubj, model.json and/or model.joblib plus metadata.json with the
+feature order, decision threshold and training metrics). The `CURRENT` file
+names the active version. Without a registry the flat legacy files in
+models/ are served as version "legacy".
+
+The active model is one `LoadedModel` object returned by `current()`,
+loaded on first use. A reload builds and warms the replacement first
+and then rebinds it, so in-flight requests finish on the model they
+started with. Callers that compute features and score in separate
+steps take one snapshot (`active = inference.current()`) and use it
+throughout.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
 from pathlib import Path
-from sklearn.pipeline import Pipeline
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app import metrics
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+MODELS_DIR = Path(__file__).parent.parent / "models"
+REGISTRY_DIR = Path(settings.MODEL_REGISTRY_DIR) if settings.MODEL_REGISTRY_DIR else MODELS_DIR / "registry"
+CURRENT_FILE = REGISTRY_DIR / "CURRENT"
+
+# Pre-registry layout
+LEGACY_VERSION = "legacy"
+MODEL_PATH = MODELS_DIR / "xgb_model.joblib"
+BOOSTER_PATH = MODELS_DIR / "xgb_model.ubj"
+TREES_PATH = MODELS_DIR / "xgb_model.json"
+MANIFEST_PATH = MODELS_DIR / "xgb_model.features.json"
+
+# Column order used when a model ships no manifest
+DEFAULT_FEATURES = ["humidity", "pm25", "particle_size", "volume_spike"]
+WARMUP_ROWS = 64
+# Versions kept loaded per process: the active one plus recent ones that
+# in-flight batches (or process-pool workers) may still ask for
+LOADED_VERSIONS = 3
+
+
+class NativeModel:
+    """Raw XGBoost booster scored with inplace_predict on float32 arrays."""
+
+    kind = "native"
+
+    def __init__(self, booster_path: Path):
+        import xgboost
+        self.booster = xgboost.Booster()
+        self.booster.load_model(str(booster_path))
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        return self.booster.inplace_predict(X)
+
+
+class PipelineModel:
+    """Full sklearn pipeline (or classifier) loaded from joblib."""
+
+    kind = "pipeline"
+
+    def __init__(self, model_path: Path, features: List[str]):
+        import joblib
+        self.pipeline = joblib.load(model_path)
+        self.features = features
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        import pandas as pd
+        return self.pipeline.predict_proba(pd.DataFrame(X, columns=self.features))[:, 1]
+
+
+class TreeModel:
+    """
+    XGBoost trees from the booster's JSON dump, evaluated with NumPy.
+    Scoring then needs neither xgboost nor the sklearn, scipy and pandas
+    imports it pulls in, which is most of a cold start.
+    """
+
+    kind = "numpy"
+
+    def __init__(self, trees_path: Path):
+        learner = json.loads(Path(trees_path).read_text())["learner"]
+        booster = learner["gradient_booster"]
+        if booster["name"] != "gbtree" or learner["objective"]["name"] != "binary:logistic":
+            raise ValueError(f"{trees_path}: only binary:logistic gbtree models are supported")
+        trees = booster["model"]["trees"]
+        if any(any(tree.get("split_type") or []) for tree in trees):
+            raise ValueError(f"{trees_path}: categorical splits are not supported")
+
+        # One row per tree, padded to the widest; leaves have no children
+        # and keep their value in split_conditions
+        width = max(len(tree["left_children"]) for tree in trees)
+
+        def stack(key, fill, dtype):
+            out = np.full((len(trees), width), fill, dtype=dtype)
+            for i, tree in enumerate(trees):
+                out[i, :len(tree[key])] = tree[key]
+            return out
+
+        left = stack("left_children", -1, np.int32)
+        right = stack("right_children", -1, np.int32)
+        # Flat node ids across all trees; leaves point at themselves, so
+        # walking past one is a no-op and rows need no per-step leaf check
+        ids = np.arange(left.size, dtype=np.int64).reshape(left.shape)
+        offsets = ids[:, :1]
+        self.left = np.where(left == -1, ids, left + offsets).ravel()
+        self.right = np.where(right == -1, ids, right + offsets).ravel()
+        self.feature = stack("split_indices", 0, np.int64).ravel()
+        self.condition = stack("split_conditions", 0.0, np.float32).ravel()
+        self.default_left = stack("default_left", 0, bool).ravel()
+        self.roots = offsets.ravel()
+        self.depth = max(self._depth(tree) for tree in trees)
+        base_score = float(str(learner["learner_model_param"]["base_score"]).strip("[]"))
+        self.base_margin = float(np.log(base_score / (1 - base_score)))
+
+    @staticmethod
+    def _depth(tree: dict) -> int:
+        depth, frontier = 0, [0]
+        while True:
+            frontier = [c for n in frontier for c in (tree["left_children"][n], tree["right_children"][n]) if c != -1]
+            if not frontier:
+                return depth
+            depth += 1
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n_rows, n_cols = X.shape
+        values = X.ravel()
+        row_base = (np.arange(n_rows, dtype=np.int64) * n_cols)[:, None]
+        # (rows, trees) matrix of current node ids, one level per step
+        node = np.broadcast_to(self.roots, (n_rows, len(self.roots))).copy()
+        for _ in range(self.depth):
+            value = values.take(row_base + self.feature.take(node))
+            go_left = value < self.condition.take(node)
+            missing = np.isnan(value)
+            if missing.any():
+                go_left = np.where(missing, self.default_left.take(node), go_left)
+            node = np.where(go_left, self.left.take(node), self.right.take(node))
+        margin = self.condition.take(node).sum(axis=1, dtype=np.float64) + self.base_margin
+        return (1.0 / (1.0 + np.exp(-margin))).astype(np.float32)
+
+
+class LoadedModel:
+    """A scorer plus the metadata it was trained with, swapped in as one object."""
+
+    def __init__(self, version: str, scorer, features: List[str], threshold: float,
+                 metadata: dict, signature: Tuple):
+        self.version = version
+        self.scorer = scorer
+        self.features = features
+        self.threshold = threshold
+        self.metadata = metadata
+        # What the artifact looked like on disk when loaded (for the watcher)
+        self.signature = signature
+
+    @property
+    def kind(self) -> str:
+        return self.scorer.kind
+
+    def feature_vector(self, features: dict) -> List[float]:
+        """Pull the model features out of a reading, in training order."""
+        return [_value(features, name) for name in self.features]
+
+    def score_matrix(self, X: np.ndarray) -> np.ndarray:
+        """Return the positive-class probability for every row of X."""
+        return self.scorer.predict_proba(X)
+
+    def predicted_type(self, proba: float) -> str:
+        return "vape" if proba >= self.threshold else "normal"
+
+    def label(self, proba: float) -> dict:
+        predicted_type = self.predicted_type(proba)
+        metrics.MODEL_SCORES.labels(self.version).observe(float(proba))
+        metrics.PREDICTIONS.labels(predicted_type).inc()
+        return {
+            "predicted_type": predicted_type,
+            "confidence":     float(proba),
+            "model_version":  self.version,
+        }
+
+    def warm_up(self):
+        """Score a throwaway batch so the first real request doesn't pay for lazy init."""
+        X = np.full((WARMUP_ROWS, len(self.features)), np.nan, dtype=np.float32)
+        self.score_matrix(X[:1])
+        self.score_matrix(X)
+
+    def is_stale(self) -> bool:
+        """Whether this version's files changed (or went away) since it was loaded."""
+        return self.signature != _signature(self.version)
+
+    def describe(self) -> dict:
+        return {
+            "version": self.version,
+            "kind": self.kind,
+            "features": self.features,
+            "threshold": self.threshold,
+            "metrics": self.metadata.get("metrics", {}),
+        }
+
+
+def _mtime(*paths: Path) -> float:
+    return max((p.stat().st_mtime for p in paths if p.exists()), default=0.0)
+
+
+def active_version() -> str:
+    """The version CURRENT points at, or the legacy layout if there is none."""
+    try:
+        version = CURRENT_FILE.read_text().strip()
+    except FileNotFoundError:
+        return LEGACY_VERSION
+    return version or LEGACY_VERSION
+
+
+def set_active_version(version: str):
+    """Point CURRENT at `version` (atomic rename, so readers never see a partial file)."""
+    if not (REGISTRY_DIR / version / "metadata.json").exists():
+        raise FileNotFoundError(f"Model version {version!r} not found in {REGISTRY_DIR}")
+    tmp = CURRENT_FILE.with_name(f".CURRENT.{os.getpid()}")
+    tmp.write_text(version + "\n")
+    os.replace(tmp, CURRENT_FILE)
+
+
+def list_versions() -> List[dict]:
+    if not REGISTRY_DIR.exists():
+        return []
+    versions = []
+    for path in sorted(REGISTRY_DIR.iterdir()):
+        meta_path = path / "metadata.json"
+        if path.is_dir() and meta_path.exists():
+            versions.append({"version": path.name, **json.loads(meta_path.read_text())})
+    return versions
+
+
+def _artifacts(version: str) -> Tuple[Path, Path, Path]:
+    """(booster, trees JSON, joblib) paths for a version."""
+    if version == LEGACY_VERSION:
+        return BOOSTER_PATH, TREES_PATH, MODEL_PATH
+    path = REGISTRY_DIR / version
+    return path / "model.ubj", path / "model.json", path / "model.joblib"
+
+
+def _signature(version: str) -> Tuple:
+    meta = MANIFEST_PATH if version == LEGACY_VERSION else REGISTRY_DIR / version / "metadata.json"
+    return (version, _mtime(meta, *_artifacts(version)))
+
+
+def _choose_scorer(version: str, features: List[str], encoder_cols: List[str], has_manifest: bool = True):
+    booster, trees, joblib_path = _artifacts(version)
+    mode = settings.INFERENCE_MODE
+    # The booster only sees encoded columns, so it can't stand in for a
+    # pipeline whose encoder actually transforms anything; and without
+    # a manifest its column order is unknown.
+    raw_ok = has_manifest and not encoder_cols
+    if mode == "numpy" or (mode == "auto" and raw_ok and trees.exists() and not booster.exists()):
+        if not (raw_ok and trees.exists()):
+            raise RuntimeError(f"INFERENCE_MODE=numpy but no usable trees JSON at {trees}")
+        return TreeModel(trees)
+    if mode != "pipeline" and raw_ok and booster.exists():
+        try:
+            return NativeModel(booster)
+        except ImportError:
+            # Slim install without xgboost
+            if mode == "auto" and trees.exists():
+                return TreeModel(trees)
+            raise
+    if mode == "native":
+        raise RuntimeError(f"INFERENCE_MODE=native but no usable booster at {booster}")
+    return PipelineModel(joblib_path, features)
+
+
+def load_version(version: str) -> LoadedModel:
+    """Load (but don't activate) one model version."""
+    signature = _signature(version)
+    if version == LEGACY_VERSION:
+        manifest = json.loads(MANIFEST_PATH.read_text()) if MANIFEST_PATH.exists() else {}
+        features = list(manifest.get("features") or DEFAULT_FEATURES)
+        scorer = _choose_scorer(version, features, manifest.get("encoder_cols") or [], bool(manifest))
+        return LoadedModel(version, scorer, features, settings.PREDICTION_THRESHOLD, manifest, signature)
+
+    path = REGISTRY_DIR / version
+    metadata = json.loads((path / "metadata.json").read_text())
+    features = list(metadata.get("features") or DEFAULT_FEATURES)
+    scorer = _choose_scorer(version, features, metadata.get("encoder_cols") or [])
+    threshold = metadata.get("threshold", settings.PREDICTION_THRESHOLD)
+    return LoadedModel(version, scorer, features, float(threshold), metadata, signature)
+
+
+def _load_model() -> LoadedModel:
+    return load_version(active_version())
+
+
+# Loaded on first use, so routes that never score don't pay for it
+_model: Optional[LoadedModel] = None
+_loaded: "OrderedDict[str, LoadedModel]" = OrderedDict()
+_lock = threading.Lock()
+_registry_listeners: List[Callable[[], None]] = []
+
+
+def current() -> LoadedModel:
+    """The active model, loading and warming it on first use."""
+    active = _model
+    return active if active is not None else activate()
+
+
+async def current_async() -> LoadedModel:
+    """current() for the event loop: the first load runs in a thread."""
+    active = _model
+    return active if active is not None else await asyncio.to_thread(activate)
+
+
+def is_loaded() -> bool:
+    return _model is not None
+
+
+def _remember(loaded: LoadedModel):
+    _loaded[loaded.version] = loaded
+    _loaded.move_to_end(loaded.version)
+    while len(_loaded) > LOADED_VERSIONS:
+        _loaded.popitem(last=False)
+
+
+def activate(version: Optional[str] = None) -> LoadedModel:
+    """
+    Swap in `version` (default: whatever CURRENT names), loading and
+    warming it first unless an unchanged copy is already loaded, which
+    makes rolling back to a recent version instant. Blocking; call it
+    from a thread when on the event loop.
+    """
+    global _model
+    version = version or active_version()
+    with _lock:
+        loaded = _loaded.get(version)
+        if loaded is None or loaded.signature != _signature(version):
+            loaded = load_version(version)
+            loaded.warm_up()
+        _remember(loaded)
+        _model = loaded
+    return loaded
+
+
+def get_version(version: str) -> LoadedModel:
+    """A loaded model for `version`, loading it without activating if needed."""
+    active = _model
+    if active is not None and active.version == version:
+        return active
+    with _lock:
+        loaded = _loaded.get(version)
+        if loaded is None:
+            loaded = load_version(version)
+            loaded.warm_up()
+            _remember(loaded)
+    return loaded
+
+
+def _value(features: dict, name: str) -> float:
+    # Temporal features are undefined until a device has enough history,
+    # and a device may not have every optional sensor; XGBoost handles NaN.
+    # A reading without a required feature must never be scored.
+    value = features.get(name)
+    if value is not None:
+        return float(value)
+    if name in settings.SENSOR_REQUIRED_FEATURES:
+        raise ValueError(f"missing required feature {name!r}")
+    return np.nan
+
+
+def score_version(version: str, X: np.ndarray) -> np.ndarray:
+    """
+    Score with the version whose features were extracted. Process-pool
+    workers hold their own copies, so this is what gets them onto a
+    version the parent has swapped in.
+    """
+    return get_version(version).score_matrix(X)
+
+
+def predict_batch(rows: List[dict]) -> List[dict]:
+    """Score many readings with a single model call."""
+    if not rows:
+        return []
+    active = current()
+    X = np.array([active.feature_vector(row) for row in rows], dtype=np.float32)
+    return [active.label(p) for p in active.score_matrix(X)]
 
-MODEL_PATH = Path(__file__).parent.parent / "models" / "xgb_model.joblib"
-model: Pipeline = joblib.load(MODEL_PATH)
 
 def predict(features: dict) -> dict:
-    df = pd.DataFrame([{
-        "humidity":      features["humidity"],
-        "pm25":          features["pm25"],
-        "particle_size": features["particle_size"],
-        "volume_spike":  features["volume_spike"],
-    }])
-    proba = model.predict_proba(df)[0, 1]
-    raw_label = model.predict(df)[0]
-    return {
-        "predicted_type": "vape" if int(raw_label) == 1 else "normal",
-        "confidence":     float(proba),
-    }
+    return predict_batch([features])[0]
+
+
+def status() -> Dict:
+    """Readiness without forcing a load: the active version's artifacts exist."""
+    active = _model
+    if active is not None:
+        return {"ok": True, "loaded": True, "kind": active.kind, "version": active.version}
+    version = active_version()
+    _, modified = _signature(version)
+    return {"ok": modified > 0, "loaded": False, "kind": None, "version": version}
+
+
+def registry_signature() -> float:
+    """Changes when a version is added, removed or renamed, or CURRENT moves."""
+    return _mtime(REGISTRY_DIR, CURRENT_FILE)
+
+
+def on_registry_change(callback: Callable[[], None]):
+    """Have the registry watcher call `callback` (on the event loop) whenever registry_signature() changes."""
+    _registry_listeners.append(callback)
+
+
+async def watch_registry(interval: float):
+    """Hot-swap when CURRENT moves or the active version's files change on disk."""
+    seen = registry_signature()
+    while True:
+        await asyncio.sleep(interval)
+        registry = registry_signature()
+        if registry != seen:
+            seen = registry
+            for callback in _registry_listeners:
+                callback()
+        active = _model
+        if active is None:
+            continue  # nothing loaded yet; the first use picks up CURRENT
+        try:
+            version = active_version()
+            if _signature(version) != active.signature:
+                await asyncio.to_thread(activate, version)
+                logger.info("Swapped model %s -> %s", active.version, version)
+        except Exception:
+            # Half-copied artifacts fail to load; keep serving and retry
+            logger.exception("Model reload failed; still serving %s", active.version)
@@ -0,0 +1,153 @@
+"""
+Steps shared by every path that ingests, stores or changes events.
+"""
+import asyncio
+import logging
+from typing import List, Set, Tuple
+
+from pymongo.errors import BulkWriteError
+
+from app import device_stats, incidents
+from app.cache import cache
+from app.config import settings
+from app.database import db
+from app.features import WindowStore
+from app.pubsub import broker
+from app.timeutils import normalize_timestamp
+
+logger = logging.getLogger(__name__)
+
+windows = WindowStore(
+    size=settings.FEATURE_WINDOW_SIZE,
+    alpha=settings.FEATURE_EWMA_ALPHA,
+    max_devices=settings.FEATURE_WINDOW_MAX_DEVICES,
+)
+
+
+def prepare(payload: dict) -> dict:
+    """Normalize an incoming reading and add its rolling features, in arrival order."""
+    normalize_timestamp(payload)
+    payload.setdefault("device_id", "unknown")
+    if settings.FEATURE_WINDOWS_ENABLED:
+        windows.enrich(payload)
+    return payload
+
+
+class IncidentUpdates:
+    """Incident changes the tracker decided on for a batch of readings, to be stored."""
+
+    def __init__(self):
+        self.writes = []
+        self.opened: List[dict] = []
+        self.changed: List[dict] = []
+        self.devices: Set[str] = set()
+        self.written = False
+
+
+def track_incidents(docs: List[dict]) -> Tuple[List[dict], IncidentUpdates]:
+    """
+    Run scored readings through the incident tracker, in order. Positive
+    readings are folded into their incident; returns the readings that
+    still need storing as events of their own, and the incident writes.
+    """
+    updates = IncidentUpdates()
+    if not settings.INCIDENTS_ENABLED:
+        return docs, updates
+    remaining = []
+    for doc in docs:
+        observation = incidents.tracker.observe(doc)
+        if observation is None:
+            remaining.append(doc)
+            continue
+        updates.writes.append(incidents.incident_write(doc, observation))
+        if observation.merged:
+            doc["incident_id"] = str(observation.incident_id)
+            updates.devices.add(doc.get("device_id") or "unknown")
+        else:
+            remaining.append(doc)
+        if observation.opened:
+            updates.opened.append(incidents.incident_document(doc, observation))
+        elif observation.state_changed:
+            updates.changed.append({
+                "_id": observation.incident_id,
+                "device_id": doc.get("device_id"),
+                "predicted_type": "vape",
+                "incident": {"state": observation.state},
+            })
+    _close_evicted(updates)
+    return remaining, updates
+
+
+def _close_evicted(updates: IncidentUpdates):
+    for incident in incidents.tracker.evicted:
+        updates.changed.append({
+            "_id": incident.incident_id,
+            "device_id": incident.device_id,
+            "predicted_type": "vape",
+            "incident": {"state": incidents.ended_state(incident)},
+        })
+        updates.devices.add(incident.device_id)
+    updates.writes += incidents.eviction_writes(incidents.tracker)
+
+
+async def store_incidents(updates: IncidentUpdates):
+    """
+    Write incident changes and announce them. If the write fails part-way
+    the applied writes are dropped from `updates`, so calling this again
+    resumes rather than repeating them.
+    """
+    if not updates.writes:
+        return
+    if not updates.written:
+        try:
+            await db.events.bulk_write(updates.writes, ordered=True)
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors")
+            if errors:
+                # Ordered: everything before the first error was applied
+                del updates.writes[:errors[0]["index"]]
+            raise
+        updates.written = True
+    await events_stored(updates.opened)
+    broker.publish(updates.changed)
+    await cache.invalidate_devices(updates.devices)
+
+
+async def coalesce_incidents(docs: List[dict]) -> List[dict]:
+    """Track and store incidents for scored readings; returns the readings still to store as events."""
+    remaining, updates = track_incidents(docs)
+    await store_incidents(updates)
+    return remaining
+
+
+async def expire_incidents() -> int:
+    """Close the incidents of devices that went quiet; returns how many."""
+    incidents.tracker.expire()
+    updates = IncidentUpdates()
+    _close_evicted(updates)
+    await store_incidents(updates)
+    return len(updates.changed)
+
+
+async def sweep_incidents(interval: float):
+    """Run expire_incidents every `interval` seconds."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await expire_incidents()
+        except Exception:
+            logger.exception("Incident sweep failed")
+
+
+async def events_stored(docs: List[dict]):
+    """Update device summaries, notify live subscribers and drop stale cache entries."""
+    if not docs:
+        return
+    await device_stats.record_events(docs)
+    broker.publish(docs)
+    await cache.invalidate_devices({doc.get("device_id") or "unknown" for doc in docs})
+
+
+async def event_changed(event: dict):
+    """An existing event was verified or annotated (rare, so "*" views are refreshed too)."""
+    await cache.invalidate_devices([event.get("device_id") or "unknown"], all_devices=True)
@@ -1,13 +1,34 @@
-from fastapi import FastAPI
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Union
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, ORJSONResponse, PlainTextResponse
 from starlette.middleware.cors import CORSMiddleware
 from app.routers.events import router as events_router
 from app.routers.devices import router as devices_router
 from app.routers.sensors import router as sensors_router
+from app.routers.stream import router as stream_router
+from app.routers.models import router as models_router
+from app.batching import batcher
+from app.config import settings
+from app.database import client, ensure_indexes
+from app import inference, ingest, metrics, readings
+from app.cache import cache
+from app.executor import InferenceSaturated, executor
+from app.pubsub import broker
+from app.mqtt import gateway
+from app.shadow import shadow
+from app.writebehind import WriteBufferFull, write_buffer
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI(
     title="Vape/Fire Detection API",
     description="Real-time vape and fire detection system with ML predictions",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
 )
 
 # CORS middleware to allow requests from any origin
@@ -18,6 +39,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(metrics.MetricsMiddleware)
 
 @app.get("/")
 async def root():
@@ -29,14 +51,121 @@ async def root():
             "events": "/api/events",
             "devices": "/api/devices",
             "sensors": "/api/sensors",
+            "stream": "/api/stream",
+            "models": "/api/models",
+            "metrics": "/metrics",
             "docs": "/docs"
         }
     }
 
+@app.exception_handler(InferenceSaturated)
+@app.exception_handler(WriteBufferFull)
+async def overloaded_handler(request: Request, exc: Union[InferenceSaturated, WriteBufferFull]):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+@app.on_event("startup")
+async def startup():
+    app.state.started_at = datetime.utcnow()
+    app.state.loop_monitor = asyncio.create_task(
+        metrics.monitor_event_loop(settings.METRICS_LOOP_LAG_INTERVAL_S)
+    )
+    if settings.MODEL_PRELOAD:
+        # Load and warm now rather than on the first scoring request
+        await asyncio.to_thread(inference.current)
+    app.state.model_watcher = None
+    if settings.MODEL_WATCH_INTERVAL_S > 0:
+        app.state.model_watcher = asyncio.create_task(inference.watch_registry(settings.MODEL_WATCH_INTERVAL_S))
+    app.state.incident_sweeper = None
+    if settings.INCIDENTS_ENABLED:
+        app.state.incident_sweeper = asyncio.create_task(ingest.sweep_incidents(settings.INCIDENT_SWEEP_INTERVAL_S))
+    if settings.ENSURE_INDEXES_ON_STARTUP:
+        # Off on serverless, where `python -m app.migrations indexes` runs
+        # as a deploy step instead of on every cold start
+        try:
+            await ensure_indexes()
+        except Exception:
+            logger.exception("Index bootstrap failed")
+        try:
+            await readings.ensure_collection()
+        except Exception:
+            logger.exception("Readings collection setup failed")
+    if settings.WRITE_BEHIND_ENABLED:
+        # Also replays anything spilled while MongoDB was unreachable
+        write_buffer.start()
+    if settings.MQTT_ENABLED:
+        await gateway.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    app.state.loop_monitor.cancel()
+    if app.state.model_watcher is not None:
+        app.state.model_watcher.cancel()
+    if app.state.incident_sweeper is not None:
+        app.state.incident_sweeper.cancel()
+    await gateway.stop()
+    await write_buffer.close()
+    await batcher.close()
+    await shadow.close()
+
+async def _check_mongo() -> dict:
+    started = time.perf_counter()
+    try:
+        await asyncio.wait_for(client.admin.command("ping"), settings.HEALTH_MONGO_TIMEOUT_S)
+    except Exception as e:
+        return {"ok": False, "error": str(e) or type(e).__name__}
+    return {"ok": True, "latency_ms": round(1000 * (time.perf_counter() - started), 2)}
+
+@app.get("/health/live")
+async def liveness():
+    """The process is up and its event loop is responsive."""
+    return {"status": "alive", "timestamp": datetime.utcnow().isoformat() + "Z"}
+
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "timestamp": "2024-01-01T00:00:00Z"}
+    """Readiness: MongoDB answers a ping and the active model's artifacts exist (it may not be loaded yet)."""
+    checks = {
+        "mongo": await _check_mongo(),
+        "model": inference.status(),
+    }
+    ready = all(check["ok"] for check in checks.values())
+    started_at = getattr(app.state, "started_at", None)
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "status": "healthy" if ready else "unhealthy",
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "uptime_s": round((datetime.utcnow() - started_at).total_seconds(), 1) if started_at else None,
+            "event_loop_lag_ms": round(1000 * metrics.LOOP_LAG.labels().value, 2),
+            "checks": checks,
+        },
+    )
+
+def _component_stats() -> dict:
+    return {
+        "batcher": {**batcher.stats.as_dict(), "pending": batcher.pending, "rejected": batcher.rejected},
+        "executor": executor.stats(),
+        "write_behind": write_buffer.stats(),
+        "cache": cache.stats(),
+        "stream": broker.stats(),
+        "mqtt": gateway.stats(),
+        "shadow": shadow.stats(),
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Prometheus text exposition of request, ingest, model, pool and loop metrics."""
+    for component, stats in _component_stats().items():
+        for stat, value in stats.items():
+            if isinstance(value, (int, float)):
+                metrics.COMPONENT.labels(component, stat).set(float(value))
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 app.include_router(events_router, prefix="/api/events", tags=["events"])
 app.include_router(devices_router, prefix="/api/devices", tags=["devices"])
 app.include_router(sensors_router, prefix="/api/sensors", tags=["sensors"])
+app.include_router(stream_router, prefix="/api/stream", tags=["stream"])
+app.include_router(models_router, prefix="/api/models", tags=["models"])
@@ -0,0 +1,236 @@
+"""
+In-process metrics exposed on /metrics in the Prometheus text format.
+
+A deliberately small registry (counters, gauges, histograms with
+labels) so the hot path doesn't pull in a client library. Each worker
+process keeps its own values; scrape every worker or run one.
+"""
+import asyncio
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from pymongo import monitoring
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SCORE_BUCKETS = (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 0.99, 1.0)
+
+REGISTRY: List["_Metric"] = []
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(zip(names, values)) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class _Value:
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class _HistogramValue:
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    @contextmanager
+    def time(self):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        REGISTRY.append(self)
+
+    def _new(self):
+        return _Value()
+
+    def labels(self, *values: str):
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._new()
+        return child
+
+    def _samples(self):
+        for values, child in self._children.items():
+            yield f"{self.name}{_format_labels(self.labelnames, values)} {child.value}"
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames)
+
+    def _new(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def _samples(self):
+        for values, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), child.counts):
+                cumulative += count
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, values, ('le', str(bound)))} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, values)} {child.sum}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, values)} {cumulative}"
+
+
+def render() -> str:
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests by route and status", ["method", "route", "status"])
+HTTP_LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency by route", ["method", "route"])
+INGEST_STAGE = Histogram(
+    "ingest_stage_duration_seconds",
+    "Time spent in each ingest stage (parse, validate, features, predict, insert, encode)",
+    ["stage"],
+)
+MODEL_SCORES = Histogram("model_score", "Positive-class probability of scored readings", ["model"], SCORE_BUCKETS)
+PREDICTIONS = Counter("predictions_total", "Scored readings by predicted type", ["predicted_type"])
+SHADOW_ROWS = Counter("shadow_rows_total", "Sampled rows scored by each shadow model", ["model"])
+SHADOW_DISAGREEMENTS = Counter(
+    "shadow_disagreements_total", "Shadow predictions whose type differs from the primary's", ["model"]
+)
+SHADOW_LATENCY = Histogram("shadow_score_duration_seconds", "Time to score a sampled batch with a shadow model", ["model"])
+SHADOW_DROPPED = Counter("shadow_dropped_rows_total", "Sampled rows skipped because shadow scoring was backed up")
+LOOP_LAG = Gauge("event_loop_lag_seconds", "Most recent event loop scheduling delay")
+LOOP_LAG_HISTOGRAM = Histogram("event_loop_lag_histogram_seconds", "Event loop scheduling delay")
+MONGO_POOL = Gauge("mongo_pool_connections", "MongoDB pool connections by state", ["state"])
+MONGO_POOL_EVENTS = Counter("mongo_pool_events_total", "MongoDB pool events", ["event"])
+MONGO_CHECKOUT = Histogram("mongo_pool_checkout_seconds", "Time to check a connection out of the MongoDB pool")
+COMPONENT = Gauge("vapeguard_component", "Point-in-time stats of internal components", ["component", "stat"])
+
+
+class MongoPoolListener(monitoring.ConnectionPoolListener):
+    """Tracks pool size and checkout latency (called from driver threads)."""
+
+    def __init__(self):
+        self._checkout_started: Dict[int, float] = {}
+
+    def pool_created(self, event):
+        MONGO_POOL_EVENTS.labels("pool_created").inc()
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        MONGO_POOL_EVENTS.labels("pool_cleared").inc()
+
+    def pool_closed(self, event):
+        MONGO_POOL_EVENTS.labels("pool_closed").inc()
+
+    def connection_created(self, event):
+        MONGO_POOL.labels("open").inc()
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        MONGO_POOL.labels("open").dec()
+
+    def connection_check_out_started(self, event):
+        MONGO_POOL.labels("waiting").inc()
+
+    def connection_check_out_failed(self, event):
+        MONGO_POOL.labels("waiting").dec()
+        MONGO_POOL_EVENTS.labels("checkout_failed").inc()
+
+    def connection_checked_out(self, event):
+        MONGO_POOL.labels("waiting").dec()
+        MONGO_POOL.labels("checked_out").inc()
+        if getattr(event, "duration", None) is not None:
+            MONGO_CHECKOUT.observe(event.duration)
+
+    def connection_checked_in(self, event):
+        MONGO_POOL.labels("checked_out").dec()
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording request counts and latency per route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            # Unmatched paths share one label so scans can't blow up cardinality
+            path = getattr(route, "path", "unmatched")
+            HTTP_LATENCY.labels(scope["method"], path).observe(time.perf_counter() - started)
+            HTTP_REQUESTS.labels(scope["method"], path, str(status)).inc()
+
+
+async def monitor_event_loop(interval: float):
+    """Measure how late the loop wakes a sleeping task (blocking work shows up here)."""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - started - interval)
+        LOOP_LAG.set(lag)
+        LOOP_LAG_HISTOGRAM.observe(lag)
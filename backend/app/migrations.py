@@ -0,0 +1,74 @@
+"""
+One-off data migrations.
+
+    python -m app.migrations timestamps   # ISO string timestamps -> BSON dates
+    python -m app.migrations indexes      # indexes and the readings collection (deploy step)
+"""
+import asyncio
+import sys
+from datetime import datetime
+
+from pymongo import UpdateOne
+
+from app import device_stats, readings
+from app.database import INDEXES, db, ensure_indexes
+from app.timeutils import parse_timestamp
+
+BATCH_SIZE = 1000
+
+
+async def _convert_collection(collection) -> int:
+    converted = 0
+    ops = []
+    cursor = collection.find({"timestamp": {"$type": "string"}}, {"timestamp": 1}).batch_size(BATCH_SIZE)
+    async for doc in cursor:
+        parsed = parse_timestamp(doc["timestamp"])
+        if parsed is not None:
+            update = {"$set": {"timestamp": parsed}}
+        else:
+            # Not a point in time (e.g. device uptime): fall back to the
+            # insert time and keep the raw value aside
+            update = {"$set": {
+                "timestamp": doc["_id"].generation_time.replace(tzinfo=None),
+                "device_timestamp": doc["timestamp"],
+            }}
+        ops.append(UpdateOne({"_id": doc["_id"], "timestamp": doc["timestamp"]}, update))
+        if len(ops) >= BATCH_SIZE:
+            converted += (await collection.bulk_write(ops, ordered=False)).modified_count
+            ops = []
+    if ops:
+        converted += (await collection.bulk_write(ops, ordered=False)).modified_count
+    return converted
+
+
+async def migrate_timestamps() -> dict:
+    """Convert string timestamps in events and feedback to BSON dates."""
+    await ensure_indexes()
+    counts = {
+        "events": await _convert_collection(db.events),
+        "feedback": await _convert_collection(db.feedback),
+    }
+    # Summaries hold copies of the old values
+    counts["device_stats"] = await device_stats.rebuild()
+    return counts
+
+
+async def migrate_indexes() -> dict:
+    """What startup does with ENSURE_INDEXES_ON_STARTUP, for deployments that turn it off."""
+    await ensure_indexes()
+    await readings.ensure_collection()
+    return {"collections": list(INDEXES), "readings_timeseries": readings.timeseries_enabled()}
+
+
+MIGRATIONS = {
+    "timestamps": migrate_timestamps,
+    "indexes": migrate_indexes,
+}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2 or sys.argv[1] not in MIGRATIONS:
+        sys.exit(f"usage: python -m app.migrations {{{'|'.join(MIGRATIONS)}}}")
+    started = datetime.utcnow()
+    result = asyncio.run(MIGRATIONS[sys.argv[1]]())
+    print(f"Migration {sys.argv[1]} finished in {(datetime.utcnow() - started).total_seconds():.1f}s: {result}")
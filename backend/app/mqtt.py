@@ -0,0 +1,300 @@
+"""
+MQTT ingestion gateway.
+
+Devices keep one long-lived connection and publish readings to
+`<MQTT_TOPIC_PREFIX>/<device_id>/readings` as a JSON object, a JSON array
+or a binary frame (app/frames.py). Messages are collected for up to
+MQTT_BATCH_WINDOW_MS or MQTT_BATCH_MAX_SIZE messages and run through the
+same pipeline as POST /api/sensors/batch. QoS 1 messages are acknowledged
+only once their batch has been stored, so the broker redelivers anything
+the gateway didn't get to. Predictions are published back to
+`<prefix>/<device_id>/predictions`.
+
+Each gateway instance connects with a persistent session under
+MQTT_CLIENT_ID, which must be stable across restarts and unique per
+instance (e.g. the StatefulSet pod name): a restarted gateway resumes its
+session and gets the QoS 1 messages it hadn't acknowledged, while a new
+id would leave them queued on an orphaned session. All instances
+subscribe through the shared subscription `$share/<MQTT_SHARED_GROUP>/...`,
+so the broker spreads readings over them instead of sending each to
+every one. At
+most MQTT_MAX_QUEUED messages wait in a gateway; beyond that the network
+thread stops reading until the batch in progress is acknowledged.
+
+A batch that fails is retried where it failed (pipeline.IngestBatch),
+so a retry doesn't store readings or move incidents twice. Transient
+failures (MongoDB unreachable, inference or the write buffer saturated)
+are retried with backoff up to MQTT_MAX_RETRIES times; after that, or
+straight away for any other error, the batch's unacknowledged messages
+are republished under MQTT_DEAD_LETTER_PREFIX, acknowledged and counted
+so one bad batch can't stall the gateway.
+
+Runs inside the API when MQTT_ENABLED, or on its own (needs paho-mqtt):
+
+    python -m app.mqtt
+"""
+import asyncio
+import logging
+import threading
+from typing import Any, List, Optional
+
+import orjson
+from pymongo.errors import ConnectionFailure, PyMongoError, WTimeoutError
+
+from app import frames, pipeline
+from app.config import settings
+from app.executor import InferenceSaturated
+from app.writebehind import WriteBufferFull
+
+logger = logging.getLogger(__name__)
+
+# Failures that go away on their own, so are worth retrying
+TRANSIENT_ERRORS = (ConnectionFailure, WTimeoutError, InferenceSaturated, WriteBufferFull)
+
+
+def _transient(e: Exception) -> bool:
+    return isinstance(e, TRANSIENT_ERRORS) or (
+        isinstance(e, PyMongoError) and e.has_error_label("RetryableWriteError")
+    )
+
+
+class MqttGateway:
+    def __init__(self, prefix: str, qos: int, max_batch_size: int, window_ms: float):
+        self.prefix = prefix
+        self.qos = qos
+        self.max_batch_size = max_batch_size
+        self.window = window_ms / 1000.0
+        self.client = None
+        self.connected = False
+        self.received = 0
+        self.batches = 0
+        self.acked = 0
+        self.decode_errors = 0
+        self.retries = 0
+        self.dead_lettered = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._slots = threading.Semaphore(max(1, settings.MQTT_MAX_QUEUED))
+        self._stopping = False
+
+    @property
+    def topic(self) -> str:
+        topic = f"{self.prefix}/+/readings"
+        return f"$share/{settings.MQTT_SHARED_GROUP}/{topic}" if settings.MQTT_SHARED_GROUP else topic
+
+    def _make_client(self):
+        import paho.mqtt.client as mqtt
+        client = mqtt.Client(
+            mqtt.CallbackAPIVersion.VERSION2,
+            client_id=settings.MQTT_CLIENT_ID,
+            # Keep the session (and unacknowledged QoS 1 messages) across reconnects
+            clean_session=False,
+            manual_ack=True,
+        )
+        if settings.MQTT_USERNAME:
+            client.username_pw_set(settings.MQTT_USERNAME, settings.MQTT_PASSWORD)
+        client.reconnect_delay_set(1, settings.MQTT_RECONNECT_MAX_S)
+        client.on_connect = self._on_connect
+        client.on_disconnect = self._on_disconnect
+        client.on_message = self._on_message
+        return client
+
+    # paho callbacks run on its network thread
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties):
+        if reason_code.is_failure:
+            logger.error("MQTT connection refused: %s", reason_code)
+            return
+        self.connected = True
+        client.subscribe(self.topic, qos=self.qos)
+        logger.info("MQTT gateway connected to %s:%s", settings.MQTT_HOST, settings.MQTT_PORT)
+
+    def _on_disconnect(self, client, userdata, flags, reason_code, properties):
+        self.connected = False
+        logger.warning("MQTT gateway disconnected: %s", reason_code)
+
+    def _on_message(self, client, userdata, message):
+        # Blocking here stops paho reading from the socket: backpressure
+        # on the broker rather than an unbounded queue
+        while not self._slots.acquire(timeout=1.0):
+            if self._stopping:
+                return
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, message)
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._slots = threading.Semaphore(max(1, settings.MQTT_MAX_QUEUED))
+        self._stopping = False
+        self.client = self._make_client()
+        self.client.connect_async(settings.MQTT_HOST, settings.MQTT_PORT, keepalive=settings.MQTT_KEEPALIVE_S)
+        self.client.loop_start()
+        self._task = self._loop.create_task(self._run())
+
+    async def stop(self):
+        """
+        Disconnect, keeping the session: unacknowledged messages are
+        redelivered when a gateway with the same MQTT_CLIENT_ID reconnects.
+        """
+        self._stopping = True
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.client is not None:
+            self.client.disconnect()
+            self.client.loop_stop()
+            self.client = None
+
+    async def _collect(self) -> list:
+        messages = [await self._queue.get()]
+        deadline = self._loop.time() + self.window
+        while len(messages) < self.max_batch_size:
+            timeout = deadline - self._loop.time()
+            if timeout <= 0:
+                break
+            try:
+                messages.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return messages
+
+    async def _run(self):
+        while True:
+            messages = await self._collect()
+            batch = None
+            attempts = 0
+            # Hold on to the batch and retry rather than ack messages that
+            # weren't stored, as long as the failure looks transient
+            while True:
+                try:
+                    if batch is None:
+                        batch = self._prepare(messages)
+                    await self._process(*batch)
+                    break
+                except Exception as e:
+                    attempts += 1
+                    unacked = [message for message, _, _ in batch[2]] if batch is not None else messages
+                    if not _transient(e) or attempts > settings.MQTT_MAX_RETRIES:
+                        logger.exception("MQTT batch failed after %d attempt(s), dead-lettering %d messages",
+                                         attempts, len(unacked))
+                        self._dead_letter(unacked)
+                        break
+                    self.retries += 1
+                    delay = min(settings.MQTT_RETRY_S * 2 ** (attempts - 1), settings.MQTT_RECONNECT_MAX_S)
+                    logger.warning("MQTT batch failed (%s), retrying in %.3gs", e, delay)
+                    await asyncio.sleep(delay)
+
+    def _dead_letter(self, messages: list):
+        for message in messages:
+            if settings.MQTT_DEAD_LETTER_PREFIX:
+                self.client.publish(f"{settings.MQTT_DEAD_LETTER_PREFIX}/{message.topic}", message.payload, qos=1)
+            self.client.ack(message.mid, message.qos)
+            self.dead_lettered += 1
+            self._slots.release()
+
+    def _decode(self, message) -> List[Any]:
+        parts = message.topic.split("/")
+        device_id = parts[-2] if len(parts) >= 3 else None
+        body = message.payload
+        if body[:1] == bytes([frames.FRAME_VERSION]):
+            payloads = frames.decode_frame(body)
+        else:
+            payloads = orjson.loads(body)
+            if not isinstance(payloads, list):
+                payloads = [payloads]
+        for payload in payloads:
+            if isinstance(payload, dict) and device_id:
+                # The topic is what the broker's ACLs authorize
+                payload["device_id"] = device_id
+        return payloads
+
+    def _prepare(self, messages: list):
+        self.received += len(messages)
+        payloads, spans = [], []
+        for message in messages:
+            try:
+                decoded = self._decode(message)
+            except ValueError as e:
+                # Redelivery won't fix a malformed message; ack and drop it
+                self.decode_errors += 1
+                logger.warning("Dropping malformed MQTT message on %s: %s", message.topic, e)
+                decoded = []
+            spans.append((message, len(payloads), len(payloads) + len(decoded)))
+            payloads.extend(decoded)
+        return pipeline.IngestBatch(payloads), payloads, spans
+
+    async def _process(self, batch: "pipeline.IngestBatch", payloads: List[Any], spans: list):
+        summary, _ = await batch.run()
+        # Acked messages leave `spans`, so a retry after a failed publish
+        # or ack doesn't ack them twice
+        while spans:
+            message, start, end = spans[0]
+            if settings.MQTT_PUBLISH_PREDICTIONS and end > start:
+                device_id = payloads[start].get("device_id") if isinstance(payloads[start], dict) else None
+                if device_id:
+                    self.client.publish(
+                        f"{self.prefix}/{device_id}/predictions",
+                        orjson.dumps([{**r, "index": r["index"] - start} for r in summary["results"][start:end]]),
+                        qos=0,
+                    )
+            self.client.ack(message.mid, message.qos)
+            spans.pop(0)
+            self.acked += 1
+            self._slots.release()
+        self.batches += 1
+
+    def stats(self) -> dict:
+        return {
+            "enabled": settings.MQTT_ENABLED,
+            "connected": self.connected,
+            "received": self.received,
+            "batches": self.batches,
+            "acked": self.acked,
+            "decode_errors": self.decode_errors,
+            "retries": self.retries,
+            "dead_lettered": self.dead_lettered,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "client_id": settings.MQTT_CLIENT_ID,
+            "topic": self.topic,
+        }
+
+
+gateway = MqttGateway(
+    prefix=settings.MQTT_TOPIC_PREFIX,
+    qos=settings.MQTT_QOS,
+    max_batch_size=settings.MQTT_BATCH_MAX_SIZE,
+    window_ms=settings.MQTT_BATCH_WINDOW_MS,
+)
+
+
+async def serve():
+    from app import ingest, readings
+    from app.executor import executor
+    from app.writebehind import write_buffer
+
+    await readings.ensure_collection()
+    await gateway.start()
+    sweeper = None
+    if settings.INCIDENTS_ENABLED:
+        sweeper = asyncio.create_task(ingest.sweep_incidents(settings.INCIDENT_SWEEP_INTERVAL_S))
+    try:
+        await asyncio.Event().wait()
+    finally:
+        if sweeper is not None:
+            sweeper.cancel()
+        await gateway.stop()
+        await write_buffer.close()
+        executor.shutdown()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
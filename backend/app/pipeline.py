@@ -0,0 +1,160 @@
+"""
+Batch ingest pipeline shared by POST /api/sensors/batch and /frame and the
+MQTT gateway: validate, score in one model call, coalesce incidents and
+store with one unordered insert_many (or queue for write-behind).
+"""
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from bson import ObjectId
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError
+
+from app import inference, ingest, readings
+from app.batching import batcher
+from app.config import settings
+from app.database import db
+from app.metrics import INGEST_STAGE
+from app.schemas import SensorReading, to_document
+from app.shadow import shadow
+from app.writebehind import write_buffer
+
+
+# MongoDB's duplicate key error code
+DUPLICATE_KEY = 11000
+
+
+def _describe(e: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(map(str, err['loc'])) or 'reading'}: {err['msg']}" for err in e.errors())
+
+
+class IngestBatch:
+    """
+    A list of readings on its way through the pipeline. Readings are
+    validated and get their rolling features when the batch is created;
+    run() then scores them, tracks incidents and stores everything. Each
+    of those steps happens once per batch: if one fails, calling run()
+    again resumes at that step, so a retry never repeats window updates,
+    incident transitions or writes that already went through.
+    """
+
+    def __init__(self, payloads: List[Any]):
+        self.results: List[Dict[str, Any]] = [{"index": i} for i in range(len(payloads))]
+        self.docs: List[dict] = []
+        self.positions: List[int] = []
+        self.queued = False
+        self._done: Set[str] = set()
+        self._standalone: List[dict] = []
+        self._incidents: Optional[ingest.IncidentUpdates] = None
+        self._samples: Optional[List[dict]] = None
+        self._failed: Dict[Any, str] = {}
+        with INGEST_STAGE.labels("validate").time():
+            for i, raw in enumerate(payloads):
+                try:
+                    payload = to_document(SensorReading.model_validate(raw))
+                except ValidationError as e:
+                    self.results[i]["error"] = f"Invalid reading: {_describe(e)}"
+                    continue
+                self.docs.append(ingest.prepare(payload))
+                self.positions.append(i)
+
+    async def run(self) -> Tuple[Dict[str, Any], bool]:
+        """
+        Score and store the batch. Returns a summary with a result or
+        error per reading, and whether the events were only queued
+        (write-behind) rather than written.
+        """
+        for step in (self._score, self._track_incidents, self._store_samples, self._store_events):
+            if step.__name__ not in self._done and self.docs:
+                await step()
+                self._done.add(step.__name__)
+        return self._summary(), self.queued
+
+    async def _score(self):
+        # One model for the whole batch, even if a reload swaps it mid-way
+        active = await inference.current_async()
+        rows, docs, positions = [], [], []
+        for i, doc in zip(self.positions, self.docs):
+            try:
+                rows.append(active.feature_vector(doc))
+            except (KeyError, TypeError, ValueError) as e:
+                self.results[i]["error"] = f"Invalid reading: {str(e)}"
+                continue
+            docs.append(doc)
+            positions.append(i)
+        self.docs, self.positions = docs, positions
+        if not docs:
+            return
+        with INGEST_STAGE.labels("predict").time():
+            probas = await batcher.score_rows(active.version, np.array(rows, dtype=np.float32))
+        shadow.observe(active, docs, probas)
+        for doc, proba in zip(docs, probas):
+            doc.update(active.label(proba))
+            doc.setdefault("verified", False)
+
+    async def _track_incidents(self):
+        if self._incidents is None:
+            self._standalone, self._incidents = ingest.track_incidents(self.docs)
+        await ingest.store_incidents(self._incidents)
+
+    async def _store_samples(self):
+        if self._samples is None:
+            self._samples = readings.samples(self.docs)
+        if not self._samples:
+            return
+        try:
+            await readings.collection().insert_many(self._samples, ordered=False)
+        except BulkWriteError as e:
+            # Keep only the samples that weren't written for the retry
+            failed = {err["index"] for err in e.details.get("writeErrors", [])}
+            self._samples = [sample for i, sample in enumerate(self._samples) if i in failed]
+            raise
+
+    async def _store_events(self):
+        events = [doc for doc in self._standalone if readings.keeps_event(doc)]
+        if not events:
+            return
+        # Ids are fixed before the first attempt, so a retried insert
+        # can tell the events it already stored (duplicate key)
+        for doc in events:
+            doc.setdefault("_id", ObjectId())
+        if settings.WRITE_BEHIND_ENABLED:
+            write_buffer.put(events)
+            self.queued = True
+            return
+        try:
+            with INGEST_STAGE.labels("insert").time():
+                await db.events.insert_many(events, ordered=False)
+        except BulkWriteError as e:
+            self._failed = {events[err["index"]]["_id"]: err.get("errmsg", "write error")
+                            for err in e.details.get("writeErrors", []) if err.get("code") != DUPLICATE_KEY}
+        await ingest.events_stored([doc for doc in events if doc["_id"] not in self._failed])
+
+    def _summary(self) -> Dict[str, Any]:
+        if "_score" in self._done:
+            for i, doc in zip(self.positions, self.docs):
+                if doc.get("_id") in self._failed:
+                    self.results[i]["error"] = self._failed[doc["_id"]]
+                    continue
+                event_id = doc.get("_id", doc.get("incident_id"))
+                self.results[i]["event_id"] = str(event_id) if event_id else None
+                self.results[i]["prediction"] = {
+                    "predicted_type": doc["predicted_type"],
+                    "confidence": doc["confidence"],
+                }
+        inserted = sum(1 for r in self.results if "prediction" in r)
+        return {
+            "status": "success" if inserted == len(self.results) else "partial",
+            "received": len(self.results),
+            "inserted": inserted,
+            "results": self.results,
+        }
+
+
+async def ingest_readings(payloads: List[Any]) -> Tuple[Dict[str, Any], bool]:
+    """
+    Validate, score and store a list of readings. Returns a summary with
+    a result or error per reading, and whether the events were only
+    queued (write-behind) rather than written.
+    """
+    return await IngestBatch(payloads).run()
@@ -0,0 +1,101 @@
+"""
+In-process fan-out of newly stored events to live stream subscribers.
+"""
+import asyncio
+from collections import deque
+from typing import Deque, Iterable, Optional, Set
+
+import orjson
+from bson import ObjectId
+
+from app.config import settings
+
+
+def _default(value):
+    # orjson handles datetimes itself
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def encode_event(doc: dict) -> str:
+    return orjson.dumps({"type": "event", "data": doc}, default=_default).decode()
+
+
+class Subscription:
+    """
+    One connected client. Holds at most `max_queue` messages; when a
+    slow client falls behind, the oldest messages are dropped.
+    """
+
+    def __init__(self, max_queue: int, device_ids: Optional[Iterable[str]] = None,
+                 predicted_types: Optional[Iterable[str]] = None):
+        self.messages: Deque[str] = deque(maxlen=max_queue)
+        self.dropped = 0
+        self._ready = asyncio.Event()
+        self.set_filters(device_ids, predicted_types)
+
+    def set_filters(self, device_ids: Optional[Iterable[str]], predicted_types: Optional[Iterable[str]]):
+        self.device_ids = set(device_ids) if device_ids else None
+        self.predicted_types = set(predicted_types) if predicted_types else None
+
+    def wants(self, doc: dict) -> bool:
+        if self.device_ids is not None and doc.get("device_id") not in self.device_ids:
+            return False
+        if self.predicted_types is not None and doc.get("predicted_type") not in self.predicted_types:
+            return False
+        return True
+
+    def put(self, message: str):
+        if len(self.messages) == self.messages.maxlen:
+            self.dropped += 1
+        self.messages.append(message)
+        self._ready.set()
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[str]:
+        """Next message, or None if nothing arrived within `timeout`."""
+        if not self.messages:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        return self.messages.popleft()
+
+
+class Broker:
+    def __init__(self, max_queue: int):
+        self.max_queue = max_queue
+        self.subscribers: Set[Subscription] = set()
+        self.published = 0
+
+    def subscribe(self, device_ids=None, predicted_types=None) -> Subscription:
+        subscription = Subscription(self.max_queue, device_ids, predicted_types)
+        self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self.subscribers.discard(subscription)
+
+    def publish(self, docs: Iterable[dict]):
+        """Hand stored events to every interested subscriber without blocking."""
+        if not self.subscribers:
+            return
+        for doc in docs:
+            self.published += 1
+            message = None
+            for subscription in self.subscribers:
+                if subscription.wants(doc):
+                    # Encode lazily, once per event
+                    message = message or encode_event(doc)
+                    subscription.put(message)
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self.subscribers),
+            "published": self.published,
+            "dropped": sum(s.dropped for s in self.subscribers),
+        }
+
+
+broker = Broker(max_queue=settings.STREAM_QUEUE_SIZE)
@@ -0,0 +1,62 @@
+"""
+Raw sensor sample storage.
+
+With STORAGE_MODE=timeseries every reading is written to a MongoDB
+time-series collection (metaField device_id, with a retention TTL) and
+only readings the model flags become documents in `events`. With the
+default STORAGE_MODE=events every reading is stored as an event, as
+before.
+"""
+from typing import List
+
+from pymongo import ASCENDING, DESCENDING
+
+from app.config import settings
+from app.database import db
+
+# Fields that belong to the event, not to the raw sample
+EVENT_ONLY_FIELDS = ("_id", "verified", "feedback_ids")
+
+
+def timeseries_enabled() -> bool:
+    return settings.STORAGE_MODE == "timeseries"
+
+
+def collection():
+    return db[settings.READINGS_COLLECTION]
+
+
+async def ensure_collection():
+    """Create the readings time-series collection, or update its retention."""
+    if not timeseries_enabled():
+        return
+    name = settings.READINGS_COLLECTION
+    expire = settings.READINGS_RETENTION_DAYS * 86400
+    if name in await db.list_collection_names(filter={"name": name}):
+        await db.command("collMod", name, expireAfterSeconds=expire)
+    else:
+        await db.create_collection(
+            name,
+            timeseries={"timeField": "timestamp", "metaField": "device_id", "granularity": "seconds"},
+            expireAfterSeconds=expire,
+        )
+    await collection().create_index([("device_id", ASCENDING), ("timestamp", DESCENDING)])
+
+
+def keeps_event(doc: dict) -> bool:
+    """Whether a scored reading should also be stored in `events`."""
+    return not timeseries_enabled() or doc.get("predicted_type") != "normal"
+
+
+def samples(docs: List[dict]) -> List[dict]:
+    """The raw samples to keep for scored readings (none unless time-series storage is on)."""
+    if not timeseries_enabled():
+        return []
+    return [{k: v for k, v in doc.items() if k not in EVENT_ONLY_FIELDS} for doc in docs]
+
+
+async def store_samples(docs: List[dict]):
+    """Write scored readings to the time-series collection (no-op otherwise)."""
+    rows = samples(docs)
+    if rows:
+        await collection().insert_many(rows, ordered=False)
@@ -1,65 +1,28 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Request
+from app.cache import ALL_DEVICES, cache
 from app.database import db
-from typing import List
-from datetime import datetime, timedelta
+from app.device_stats import summarize
+from typing import List, Optional
 
 router = APIRouter()
 
 @router.get("/", response_model=List[dict])
-async def get_device_summary():
+async def get_device_summary(
+    request: Request,
+    device_id: Optional[List[str]] = Query(None),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+):
     """Get a summary of all devices and their recent activity"""
-    # Get unique device IDs from events collection
-    pipeline = [
-        {"$group": {"_id": "$device_id"}},
-        {"$project": {"device_id": "$_id", "_id": 0}}
-    ]
-    
-    cursor = db.events.aggregate(pipeline)
-    devices = []
-    
-    # For each device, get summary information
-    async for device_doc in cursor:
-        device_id = device_doc.get("device_id")
-        if not device_id:
-            continue
-            
-        # Get the most recent event for this device
-        latest_event = await db.events.find_one(
-            {"device_id": device_id},
-            sort=[("timestamp", -1)]
-        )
-        
-        # Count total events for this device
-        event_count = await db.events.count_documents({"device_id": device_id})
-        
-        # Count recent events (last 24 hours)
-        one_day_ago = (datetime.utcnow() - timedelta(days=1)).isoformat()
-        recent_count = await db.events.count_documents({
-            "device_id": device_id,
-            "timestamp": {"$gte": one_day_ago}
-        })
-        
-        # Get verification stats
-        verified_count = await db.events.count_documents({
-            "device_id": device_id,
-            "verified": True
-        })
-        
-        # Build device summary
-        device_summary = {
-            "device_id": device_id,
-            "total_events": event_count,
-            "recent_events": recent_count,
-            "verified_events": verified_count,
-            "last_seen": latest_event.get("timestamp") if latest_event else None,
-            "last_location": latest_event.get("location") if latest_event else None
-        }
-        
-        # If the latest event has an _id, convert it to string
-        if latest_event and "_id" in latest_event:
-            latest_event["_id"] = str(latest_event["_id"])
-            device_summary["latest_event"] = latest_event
-        
-        devices.append(device_summary)
-    
-    return devices
\ No newline at end of file
+    query = {"_id": {"$in": device_id}} if device_id else {}
+
+    async def load():
+        total = await db.device_stats.count_documents(query)
+        cursor = db.device_stats.find(query).sort("_id", 1).skip(skip).limit(limit)
+        devices = [summarize(stats) async for stats in cursor]
+        return devices, {"X-Total-Count": str(total)}
+
+    try:
+        return await cache.respond(request, device_id or [ALL_DEVICES], load)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting device summary: {str(e)}")
@@ -1,38 +1,205 @@
-from fastapi import APIRouter, HTTPException, Body
-from app.database import db
-from app.inference import predict
+from fastapi import APIRouter, HTTPException, Body, Query, Request
+from fastapi.responses import StreamingResponse
+from app.config import settings
+from app.database import db, index_names
+from app.timeutils import parse_timestamp
+from app.batching import batcher
+from app import device_stats, export, ingest, readings
+from app.cache import ALL_DEVICES, cache
+from app.schemas import SensorReading, to_document
 from datetime import datetime
 from typing import Optional, List, Dict, Any
 from bson import ObjectId
+from pymongo import ReturnDocument
 
 router = APIRouter()
 
 @router.post("/", status_code=201)
-async def create_event(payload: dict):
-    # 1) Ensure a timestamp
-    payload.setdefault("timestamp", datetime.utcnow().isoformat())
+async def create_event(reading: SensorReading):
+    # 1) Validated like /api/sensors/data; ensure a timestamp (stored as
+    #    a BSON date) and rolling features
+    payload = to_document(reading)
+    ingest.prepare(payload)
     # 2) Run the model
-    result = predict(payload)
+    result = await batcher.submit(payload)
     # 3) Build full document
     doc = {**payload, **result}
     # 4) Add verified field (default to False)
     doc.setdefault("verified", False)
     # 5) Insert into MongoDB
     insert_result = await db.events.insert_one(doc)
-    # 6) Replace _id with its string form
+    # 6) Update device summary, live stream and cache
+    await ingest.events_stored([doc])
+    # 7) Replace _id with its string form
     doc["_id"] = str(insert_result.inserted_id)
-    # 7) Return JSON‐friendly document
+    # 8) Return JSON‐friendly document
     return doc
 
+def _parse_cursor(token: str):
+    """Split a `<timestamp>,<_id>` pagination token."""
+    try:
+        timestamp, event_id = token.rsplit(",", 1)
+        parsed = parse_timestamp(timestamp)
+        if parsed is None:
+            raise ValueError(f"bad timestamp {timestamp!r}")
+        return parsed, ObjectId(event_id)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid cursor: {str(e)}")
+
+def _make_cursor(doc: dict) -> Optional[str]:
+    timestamp = doc.get("timestamp")
+    if not isinstance(timestamp, datetime):
+        return None
+    return f"{timestamp.isoformat()},{doc['_id']}"
+
+def _event_filter(
+    device_id: Optional[List[str]] = None,
+    predicted_type: Optional[str] = None,
+    verified: Optional[bool] = None,
+    min_confidence: Optional[float] = None,
+    max_confidence: Optional[float] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+) -> Dict[str, Any]:
+    query: Dict[str, Any] = {}
+    if device_id:
+        query["device_id"] = {"$in": device_id}
+    if predicted_type:
+        query["predicted_type"] = predicted_type
+    if verified is not None:
+        query["verified"] = verified
+    confidence = {}
+    if min_confidence is not None:
+        confidence["$gte"] = min_confidence
+    if max_confidence is not None:
+        confidence["$lte"] = max_confidence
+    if confidence:
+        query["confidence"] = confidence
+    window = {}
+    if start:
+        window["$gte"] = parse_timestamp(start)
+    if end:
+        window["$lt"] = parse_timestamp(end)
+    if window:
+        query["timestamp"] = window
+    return query
+
+def _projection(fields: Optional[str]) -> Optional[Dict[str, int]]:
+    if not fields:
+        return None
+    projection = {name.strip(): 1 for name in fields.split(",") if name.strip()}
+    # Needed to build the next cursor
+    projection["timestamp"] = 1
+    return projection
+
 @router.get("/", response_model=List[dict])
-async def get_events(limit: int = 10):
-    """Get recent events with optional limit"""
-    cursor = db.events.find().sort("timestamp", -1).limit(limit)
-    events = []
-    async for doc in cursor:
-        doc["_id"] = str(doc["_id"])
-        events.append(doc)
-    return events
+async def get_events(
+    request: Request,
+    limit: int = Query(10, ge=1, le=1000),
+    before: Optional[str] = None,
+    device_id: Optional[List[str]] = Query(None),
+    predicted_type: Optional[str] = None,
+    verified: Optional[bool] = None,
+    min_confidence: Optional[float] = None,
+    max_confidence: Optional[float] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    fields: Optional[str] = None,
+):
+    """
+    Get recent events, newest first.
+
+    Pass the X-Next-Cursor header of a response as `before` to fetch the
+    next page. `fields` is a comma-separated list of fields to return.
+    """
+    query = _event_filter(device_id, predicted_type, verified, min_confidence, max_confidence, start, end)
+    if before:
+        timestamp, event_id = _parse_cursor(before)
+        page = {"$or": [
+            {"timestamp": {"$lt": timestamp}},
+            {"timestamp": timestamp, "_id": {"$lt": event_id}},
+        ]}
+        query = {"$and": [query, page]} if query else page
+
+    async def load():
+        cursor = db.events.find(query, _projection(fields)).sort([("timestamp", -1), ("_id", -1)]).limit(limit)
+        events = []
+        async for doc in cursor:
+            events.append(doc)
+
+        headers = {}
+        if len(events) == limit:
+            next_cursor = _make_cursor(events[-1])
+            if next_cursor:
+                headers["X-Next-Cursor"] = next_cursor
+        for doc in events:
+            doc["_id"] = str(doc["_id"])
+        return events, headers
+
+    return await cache.respond(request, device_id or [ALL_DEVICES], load)
+
+@router.get("/export")
+async def export_events(
+    format: str = Query("ndjson", pattern="^(ndjson|csv|parquet)$"),
+    source: str = Query("events", pattern="^(events|readings)$"),
+    limit: Optional[int] = Query(None, ge=1),
+    device_id: Optional[List[str]] = Query(None),
+    predicted_type: Optional[str] = None,
+    verified: Optional[bool] = None,
+    min_confidence: Optional[float] = None,
+    max_confidence: Optional[float] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    fields: Optional[str] = None,
+):
+    """
+    Stream every matching event (or raw reading, with source=readings)
+    oldest first as NDJSON, CSV or Parquet, for offline analysis and
+    retraining (`python train_model.py --data <file> --label ...`).
+
+    Filters match GET /api/events/ and are applied by MongoDB; `fields`
+    limits the exported columns (CSV and Parquet otherwise get a fixed
+    default set, see app.export). The rows come off an index in order
+    and are encoded chunk by chunk as the cursor is read, so the export
+    is never held in memory whole.
+    """
+    if format == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise HTTPException(status_code=501, detail="Parquet export requires pyarrow")
+    query = _event_filter(device_id, predicted_type, verified, min_confidence, max_confidence, start, end)
+    columns = [name.strip() for name in fields.split(",") if name.strip()] if fields else None
+    if format != "ndjson" or columns:
+        projection = dict.fromkeys(export.columns(columns), 1)
+    elif source == "readings":
+        projection = {"feedback_ids": 0}
+    else:
+        projection = None
+    try:
+        if source == "readings" and readings.timeseries_enabled():
+            # Time-series collections are stored in time order
+            cursor = readings.collection().find(query, projection).sort("timestamp", 1)
+        else:
+            # Walk the (timestamp, _id) index backwards so nothing is sorted
+            # in memory. Hinting a missing index (not created yet, or an old
+            # deployment) would only fail once the 200 has been sent, so
+            # leave the plan to MongoDB then
+            index = "device_id_timestamp_id" if device_id else "timestamp_id"
+            cursor = db.events.find(query, projection).sort([("timestamp", 1), ("_id", 1)])
+            if index in await index_names(db.events):
+                cursor = cursor.hint(index)
+        cursor = cursor.batch_size(settings.EXPORT_BATCH_SIZE)
+        if limit:
+            cursor = cursor.limit(limit)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error exporting events: {str(e)}")
+    filename = f"{source}-{datetime.utcnow():%Y%m%dT%H%M%S}.{format}"
+    return StreamingResponse(
+        export.ENCODERS[format](cursor, columns),
+        media_type=export.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
 
 @router.get("/{event_id}", response_model=dict)
 async def get_event(event_id: str):
@@ -50,17 +217,23 @@ async def get_event(event_id: str):
 async def verify_event(event_id: str, verified: bool = Body(...)):
     """Update the verified status of an event"""
     try:
-        result = await db.events.update_one(
+        previous = await db.events.find_one_and_update(
             {"_id": ObjectId(event_id)},
-            {"$set": {"verified": verified}}
+            {"$set": {"verified": verified}},
+            return_document=ReturnDocument.BEFORE
         )
         
-        if result.matched_count == 0:
+        if previous is None:
             raise HTTPException(status_code=404, detail="Event not found")
+
+        await device_stats.record_verification(previous, verified)
+        await ingest.event_changed(previous)
             
-        updated_doc = await db.events.find_one({"_id": ObjectId(event_id)})
+        updated_doc = {**previous, "verified": verified}
         updated_doc["_id"] = str(updated_doc["_id"])
         return updated_doc
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error updating event: {str(e)}")
 
@@ -74,7 +247,7 @@ async def add_event_feedback(event_id: str, feedback: Dict[str, Any] = Body(...)
             raise HTTPException(status_code=404, detail="Event not found")
         
         # Add timestamp to feedback
-        feedback["timestamp"] = datetime.utcnow().isoformat()
+        feedback["timestamp"] = datetime.utcnow()
         
         # Add event reference to feedback
         feedback["event_id"] = event_id
@@ -87,6 +260,7 @@ async def add_event_feedback(event_id: str, feedback: Dict[str, Any] = Body(...)
             {"_id": ObjectId(event_id)},
             {"$push": {"feedback_ids": str(result.inserted_id)}}
         )
+        await ingest.event_changed(event)
         
         # Return the feedback with string ID
         feedback["_id"] = str(result.inserted_id)
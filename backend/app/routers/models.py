@@ -0,0 +1,59 @@
+import asyncio
+import secrets
+from fastapi import APIRouter, Depends, Header, HTTPException
+from typing import Optional
+
+from app import inference
+from app.config import settings
+
+router = APIRouter()
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Model changes need X-Admin-Token; they are disabled until MODEL_ADMIN_TOKEN is configured."""
+    expected = settings.MODEL_ADMIN_TOKEN
+    if not expected:
+        raise HTTPException(status_code=403, detail="Model administration is disabled (MODEL_ADMIN_TOKEN not set)")
+    if not secrets.compare_digest(x_admin_token or "", expected):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+@router.get("/")
+async def list_models():
+    """Registry versions, the version CURRENT names and what this worker serves."""
+    try:
+        return {
+            "active_version": inference.active_version(),
+            "serving": inference.current().describe() if inference.is_loaded() else None,
+            "versions": await asyncio.to_thread(inference.list_versions),
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error listing models: {str(e)}")
+
+
+@router.post("/reload", dependencies=[Depends(require_admin)])
+async def reload_model():
+    """Load, warm up and swap in the version CURRENT names (this worker; others follow via the watcher)."""
+    try:
+        loaded = await asyncio.to_thread(inference.activate)
+        return {"status": "success", "serving": loaded.describe()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error reloading model: {str(e)}")
+
+
+@router.post("/{version}/activate", dependencies=[Depends(require_admin)])
+async def activate_model(version: str):
+    """Roll out (or back) to `version`: load and warm it here, then point CURRENT at it."""
+    if version == inference.LEGACY_VERSION or version.startswith(".") or "/" in version:
+        raise HTTPException(status_code=400, detail=f"Invalid model version: {version}")
+    try:
+        # Load and warm before moving CURRENT so a broken artifact never
+        # becomes active; the swap itself is then a cache hit
+        await asyncio.to_thread(inference.get_version, version)
+        await asyncio.to_thread(inference.set_active_version, version)
+        loaded = await asyncio.to_thread(inference.activate, version)
+        return {"status": "success", "serving": loaded.describe()}
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Model version {version} not found")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error activating model: {str(e)}")
@@ -1,71 +1,230 @@
-from fastapi import APIRouter, HTTPException
+import orjson
+from bson import ObjectId
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import ORJSONResponse
+from pydantic import ValidationError
 from app.database import db
-from app.inference import predict
-from datetime import datetime, timedelta
-from typing import Dict, Any
+from app.timeutils import parse_timestamp
+from app import device_stats, frames, ingest, pipeline, readings
+from app.cache import ALL_DEVICES, cache
+from app.batching import batcher
+from app.config import settings
+from app.executor import InferenceSaturated, executor
+from app.metrics import INGEST_STAGE
+from app.schemas import SensorReading, to_document
+from app.mqtt import gateway
+from app.shadow import shadow
+from app.writebehind import WriteBufferFull, write_buffer
+from datetime import datetime
+from typing import Dict, Any, List, Optional
 
 router = APIRouter()
 
-@router.post("/data", status_code=201)
-async def receive_sensor_data(payload: Dict[str, Any]):
+# The body is parsed by hand (straight from bytes by pydantic-core), so
+# document it explicitly
+READING_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {"application/json": {"schema": SensorReading.model_json_schema()}},
+    }
+}
+
+class IngestResponse(ORJSONResponse):
+    """Times its own encoding as the `encode` ingest stage."""
+
+    def render(self, content: Any) -> bytes:
+        with INGEST_STAGE.labels("encode").time():
+            return super().render(content)
+
+@router.post("/data", status_code=201, openapi_extra=READING_BODY, response_class=IngestResponse)
+async def receive_sensor_data(request: Request, response: Response):
     """
     Receive sensor data from ESP32 devices or simulation.
     Process the data through the ML model and store results.
+    With write-behind enabled the event is queued and 202 is returned.
     """
+    body = await request.body()
     try:
-        # Ensure a timestamp if not provided
-        payload.setdefault("timestamp", datetime.utcnow().isoformat())
-        
-        # Ensure device_id is present
-        if "device_id" not in payload:
-            payload["device_id"] = "unknown"
+        with INGEST_STAGE.labels("parse").time():
+            payload = to_document(SensorReading.model_validate_json(body))
+    except ValidationError as e:
+        raise RequestValidationError([
+            {**err, "loc": ("body", *err["loc"])} for err in e.errors(include_url=False, include_context=False)
+        ])
+
+    try:
+        # Ensure a timestamp (stored as a BSON date) and device_id, and
+        # add the device's rolling features
+        with INGEST_STAGE.labels("features").time():
+            ingest.prepare(payload)
         
         # Run the ML model prediction
-        result = predict(payload)
+        with INGEST_STAGE.labels("predict").time():
+            result = await batcher.submit(payload)
         
         # Build full document with sensor data and prediction results
         doc = {**payload, **result}
         
         # Add verified field (default to False)
         doc.setdefault("verified", False)
+
+        # Fold positive readings into an ongoing incident (if enabled)
+        standalone = await ingest.coalesce_incidents([doc])
+
+        # Keep the raw sample in the time-series collection (if enabled)
+        await readings.store_samples([doc])
         
         # Insert into MongoDB events collection
-        insert_result = await db.events.insert_one(doc)
-        
-        # Replace _id with its string form for JSON response
-        doc["_id"] = str(insert_result.inserted_id)
+        event_id = doc.get("incident_id")
+        if standalone and readings.keeps_event(doc) and settings.WRITE_BEHIND_ENABLED:
+            doc["_id"] = ObjectId()
+            write_buffer.put([doc])
+            event_id = str(doc["_id"])
+            response.status_code = 202
+        elif standalone and readings.keeps_event(doc):
+            with INGEST_STAGE.labels("insert").time():
+                insert_result = await db.events.insert_one(doc)
+            await ingest.events_stored([doc])
+            # Replace _id with its string form for JSON response
+            event_id = str(insert_result.inserted_id)
         
         # Return the processed document
         return {
             "status": "success",
             "message": "Sensor data processed successfully",
-            "event_id": doc["_id"],
+            "event_id": event_id,
             "prediction": {
-                "predicted_class": result.get("predicted_class"),
+                "predicted_type": result.get("predicted_type"),
                 "confidence": result.get("confidence")
             }
         }
         
+    except (InferenceSaturated, WriteBufferFull):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing sensor data: {str(e)}")
 
+def _parse_batch_body(body: bytes, content_type: str) -> List[Any]:
+    """Accept either a JSON array or newline-delimited JSON."""
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        return [orjson.loads(line) for line in body.splitlines() if line.strip()]
+    payloads = orjson.loads(body)
+    if not isinstance(payloads, list):
+        raise ValueError("Expected a JSON array of readings")
+    return payloads
+
+@router.post("/batch", status_code=201, response_class=IngestResponse)
+async def receive_sensor_batch(request: Request, response: Response):
+    """
+    Receive many sensor readings (JSON array or NDJSON) in one request.
+    All valid readings are scored in one model call and stored with a
+    single unordered insert_many (or queued for one, returning 202, when
+    write-behind is enabled). Returns a result or error per row.
+    """
+    body = await request.body()
+    try:
+        with INGEST_STAGE.labels("parse").time():
+            payloads = _parse_batch_body(body, request.headers.get("content-type", ""))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid batch body: {str(e)}")
+    return await _ingest_readings(payloads, response)
+
+@router.post("/frame", status_code=201, response_class=IngestResponse)
+async def receive_sensor_frame(request: Request, response: Response):
+    """
+    Receive a compact binary frame of readings from one device (see
+    app/frames.py for the layout). Frames go through the same pipeline
+    and return the same per-reading results as /batch.
+    """
+    body = await request.body()
+    try:
+        with INGEST_STAGE.labels("parse").time():
+            payloads = frames.decode_frame(body)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid frame: {str(e)}")
+    return await _ingest_readings(payloads, response)
+
+async def _ingest_readings(payloads: List[Any], response: Response) -> Dict[str, Any]:
+    """Validate, score and store a list of readings, with a result per reading."""
+    if len(payloads) > settings.SENSOR_BATCH_MAX_ROWS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large: {len(payloads)} readings (max {settings.SENSOR_BATCH_MAX_ROWS})"
+        )
+    try:
+        summary, queued = await pipeline.ingest_readings(payloads)
+    except (InferenceSaturated, WriteBufferFull):
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing sensor batch: {str(e)}")
+    if queued:
+        response.status_code = 202
+    return summary
+
 @router.get("/status")
-async def get_sensor_status():
+async def get_sensor_status(request: Request):
     """
     Get the status of sensor data reception.
     """
-    try:
-        # Get count of recent sensor data (last hour)
-        one_hour_ago = (datetime.utcnow() - timedelta(hours=1)).isoformat()
-        recent_count = await db.events.count_documents({
-            "timestamp": {"$gte": one_hour_ago}
-        })
-        
+    async def load():
+        # Get count of recent sensor data (last hour, at hourly granularity)
+        cursor = db.device_stats.find({}, {"hourly": 1})
+        recent_count = sum([device_stats.recent_count(stats, 1) async for stats in cursor])
         return {
             "status": "active",
             "recent_events": recent_count,
             "last_updated": datetime.utcnow().isoformat()
-        }
+        }, {}
+
+    try:
+        return await cache.respond(request, [ALL_DEVICES], load)
         
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error getting sensor status: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error getting sensor status: {str(e)}")
+
+@router.get("/history")
+async def get_sensor_history(
+    device_id: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: int = Query(1000, ge=1, le=10000),
+):
+    """
+    Get raw readings for one device over a time window, newest first.
+    Served from the time-series collection when it is enabled.
+    """
+    query: Dict[str, Any] = {"device_id": device_id}
+    window = {}
+    if start:
+        window["$gte"] = parse_timestamp(start)
+    if end:
+        window["$lt"] = parse_timestamp(end)
+    if window:
+        query["timestamp"] = window
+    source = readings.collection() if readings.timeseries_enabled() else db.events
+    try:
+        cursor = source.find(query, {"feedback_ids": 0}).sort("timestamp", -1).limit(limit)
+        samples = []
+        async for doc in cursor:
+            doc["_id"] = str(doc["_id"])
+            samples.append(doc)
+        return samples
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting sensor history: {str(e)}")
+
+@router.get("/inference/stats")
+async def get_inference_stats():
+    """
+    Get micro-batching and worker pool metrics for the inference engine.
+    """
+    return {
+        **batcher.stats.as_dict(),
+        "pending": batcher.pending,
+        "rejected": batcher.rejected,
+        "pool": executor.stats(),
+        "cache": cache.stats(),
+        "write_behind": write_buffer.stats(),
+        "mqtt": gateway.stats(),
+        "shadow": shadow.stats(),
+    }
@@ -0,0 +1,96 @@
+import asyncio
+import json
+from fastapi import APIRouter, Query, Request, WebSocket
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
+
+from app.config import settings
+from app.pubsub import broker
+
+router = APIRouter()
+
+@router.get("/")
+async def stream_events(
+    request: Request,
+    device_id: Optional[List[str]] = Query(None),
+    predicted_type: Optional[List[str]] = Query(None),
+):
+    """
+    Server-sent events stream of newly stored events, optionally filtered
+    by device and predicted type.
+    """
+    subscription = broker.subscribe(device_id, predicted_type)
+
+    async def events():
+        try:
+            while not await request.is_disconnected():
+                message = await subscription.get(timeout=settings.STREAM_HEARTBEAT_S)
+                # A comment line keeps idle connections open through proxies
+                yield f"data: {message}\n\n" if message is not None else ": keepalive\n\n"
+        finally:
+            broker.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def _filter_values(message: dict, name: str) -> Optional[List[str]]:
+    """A subscribe filter: a list of strings or a single string."""
+    value = message.get(name)
+    if value is None or isinstance(value, str):
+        return [value] if value else None
+    if isinstance(value, list) and all(isinstance(item, str) for item in value):
+        return value
+    raise ValueError(f"{name} must be a string or a list of strings")
+
+@router.websocket("/ws")
+async def stream_events_ws(
+    websocket: WebSocket,
+    device_id: Optional[List[str]] = Query(None),
+    predicted_type: Optional[List[str]] = Query(None),
+):
+    """
+    WebSocket stream of newly stored events.
+
+    Clients may send {"type": "subscribe", "device_id": [...],
+    "predicted_type": [...]} to change filters (a single string works
+    too; anything else gets an {"type": "error"} frame) and
+    {"type": "ping"} to get a pong.
+    """
+    await websocket.accept()
+    subscription = broker.subscribe(device_id, predicted_type)
+
+    async def receive():
+        while True:
+            try:
+                message = json.loads(await websocket.receive_text())
+            except ValueError:
+                continue
+            if not isinstance(message, dict):
+                continue
+            if message.get("type") == "ping":
+                subscription.put(json.dumps({"type": "pong"}))
+            elif message.get("type") == "subscribe":
+                try:
+                    filters = _filter_values(message, "device_id"), _filter_values(message, "predicted_type")
+                except ValueError as e:
+                    subscription.put(json.dumps({"type": "error", "detail": str(e)}))
+                    continue
+                subscription.set_filters(*filters)
+
+    async def send():
+        while True:
+            message = await subscription.get()
+            await websocket.send_text(message)
+
+    # Either side ending (usually a WebSocketDisconnect) closes the stream
+    tasks = [asyncio.create_task(receive()), asyncio.create_task(send())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        broker.unsubscribe(subscription)
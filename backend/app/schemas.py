@@ -0,0 +1,70 @@
+"""
+Request schemas for sensor readings.
+
+`SensorReading` validates the fields devices are known to send and
+rejects malformed values before a reading reaches inference or storage.
+Fields it doesn't know about are kept, dropped or rejected according to
+SENSOR_EXTRA_FIELDS. `to_document` then maps device fields onto the model
+features (SENSOR_FEATURE_MAP), so e.g. the ESP32's `sound_level` can feed
+`volume_spike`.
+"""
+from datetime import datetime
+from typing import Any, Dict, Optional, Union
+
+from pydantic import BaseModel, ConfigDict, Field, field_validator, model_validator
+
+from app.config import settings
+
+EXTRA_MODES = {"keep": "allow", "drop": "ignore", "reject": "forbid"}
+
+
+class SensorReading(BaseModel):
+    model_config = ConfigDict(extra=EXTRA_MODES[settings.SENSOR_EXTRA_FIELDS], allow_inf_nan=False)
+
+    device_id: str = Field("unknown", min_length=1, max_length=128)
+    location: Optional[str] = Field(None, max_length=256)
+    # ISO 8601 or a device counter; normalized later by timeutils
+    timestamp: Optional[Union[datetime, str, int, float]] = None
+    sensor_type: Optional[str] = None
+
+    humidity: Optional[float] = Field(None, ge=0, le=100)
+    pm25: Optional[float] = Field(None, ge=0)
+    pm10: Optional[float] = Field(None, ge=0)
+    particle_size: Optional[float] = Field(None, ge=0)
+    volume_spike: Optional[float] = Field(None, ge=0)
+    sound_level: Optional[float] = None
+    gas_resistance: Optional[float] = Field(None, ge=0)
+    temperature: Optional[float] = None
+    pressure: Optional[float] = Field(None, ge=0)
+    wifi_rssi: Optional[float] = None
+
+    @field_validator("*", mode="before")
+    @classmethod
+    def _sentinel_is_missing(cls, value):
+        # The firmware reports a failed sensor read as SENSOR_MISSING_VALUE
+        return None if value == settings.SENSOR_MISSING_VALUE else value
+
+    @model_validator(mode="after")
+    def _has_required_features(self):
+        missing = [name for name in settings.SENSOR_REQUIRED_FEATURES if _feature(self, name) is None]
+        if missing:
+            raise ValueError(f"missing required features: {', '.join(missing)}")
+        return self
+
+
+def _feature(reading: SensorReading, name: str) -> Any:
+    value = getattr(reading, name, None)
+    if value is None and name in settings.SENSOR_FEATURE_MAP:
+        value = getattr(reading, settings.SENSOR_FEATURE_MAP[name], None)
+    return value
+
+
+def to_document(reading: SensorReading) -> Dict[str, Any]:
+    """The reading as a plain dict, with mapped model features filled in."""
+    doc = reading.model_dump(exclude_none=True)
+    for name in settings.SENSOR_FEATURE_MAP:
+        if name not in doc:
+            value = _feature(reading, name)
+            if value is not None:
+                doc[name] = value
+    return doc
@@ -0,0 +1,194 @@
+"""
+Shadow scoring of candidate models on live traffic.
+
+After the primary model scores a batch, a SHADOW_SAMPLE_RATE fraction of
+its rows is copied and handed to a background task, which scores them
+with every SHADOW_MODELS registry version on a small dedicated thread
+pool (SHADOW_WORKERS bounds the extra CPU) and writes one record per row
+to SHADOW_COLLECTION. The ingest path only pays for the sampling and
+the copies; when SHADOW_MAX_PENDING batches are already in flight new
+samples are dropped rather than queued.
+"""
+import asyncio
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Set
+
+import numpy as np
+
+from app import inference, metrics
+from app.config import settings
+from app.database import db
+
+logger = logging.getLogger(__name__)
+
+
+class ShadowScorer:
+    def __init__(self, versions: Sequence[str], sample_rate: float, max_pending: int, workers: int,
+                 collection: str):
+        self.versions = list(versions)
+        self.sample_rate = sample_rate
+        self.max_pending = max(1, max_pending)
+        self.workers = max(1, workers)
+        self.collection = collection
+        self._models: Dict[str, inference.LoadedModel] = {}
+        self._unavailable: Set[str] = set()
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self.sampled = 0
+        self.dropped = 0
+        self.errors = 0
+        self.stored = 0
+        self._rows = dict.fromkeys(self.versions, 0)
+        self._disagreements = dict.fromkeys(self.versions, 0)
+        self._busy = dict.fromkeys(self.versions, 0.0)
+        inference.on_registry_change(self.registry_changed)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.versions) and self.sample_rate > 0
+
+    def observe(self, active: "inference.LoadedModel", readings: List[dict], probas: Sequence[float]):
+        """Sample rows the primary just scored and shadow-score them in the background."""
+        if not self.enabled:
+            return
+        versions = [v for v in self.versions if v != active.version and v not in self._unavailable]
+        if not versions:
+            return
+        picked = [i for i in range(len(readings)) if random.random() < self.sample_rate]
+        if not picked:
+            return
+        if len(self._tasks) >= self.max_pending:
+            self.dropped += len(picked)
+            metrics.SHADOW_DROPPED.inc(len(picked))
+            return
+        self.sampled += len(picked)
+        # Copies: the originals are still being labelled and stored
+        rows = [dict(readings[i]) for i in picked]
+        primary = [
+            {"version": active.version, "confidence": float(probas[i]),
+             "predicted_type": active.predicted_type(probas[i])}
+            for i in picked
+        ]
+        task = asyncio.get_running_loop().create_task(self._shadow(versions, rows, primary))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def registry_changed(self):
+        """Versions were added or removed: retry the ones that were missing."""
+        self._unavailable.clear()
+
+    def _model(self, version: str) -> "inference.LoadedModel":
+        # Reload a candidate whose artifacts were replaced (or removed) on disk
+        model = self._models.get(version)
+        if model is None or model.is_stale():
+            model = inference.load_version(version)
+            model.warm_up()
+            self._models[version] = model
+        return model
+
+    def _score(self, version: str, rows: List[dict]):
+        # Runs on the shadow pool; a candidate may use different features
+        model = self._model(version)
+        started = time.perf_counter()
+        X = np.array([model.feature_vector(row) for row in rows], dtype=np.float32)
+        probas = model.score_matrix(X)
+        return model, probas, time.perf_counter() - started
+
+    async def _shadow(self, versions: List[str], rows: List[dict], primary: List[dict]):
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix="shadow")
+        loop = asyncio.get_running_loop()
+        records = [
+            {
+                "device_id": row.get("device_id"),
+                "timestamp": row.get("timestamp"),
+                "scored_at": datetime.utcnow(),
+                "primary": p,
+                "shadows": [],
+            }
+            for row, p in zip(rows, primary)
+        ]
+        for version in versions:
+            try:
+                model, probas, elapsed = await loop.run_in_executor(self._pool, self._score, version, rows)
+            except FileNotFoundError:
+                logger.error("Shadow model %s not found in the registry; skipping it", version)
+                self._unavailable.add(version)
+                continue
+            except Exception:
+                self.errors += 1
+                logger.exception("Shadow scoring with %s failed", version)
+                continue
+            disagreements = 0
+            for record, proba in zip(records, probas):
+                predicted_type = model.predicted_type(proba)
+                agrees = predicted_type == record["primary"]["predicted_type"]
+                disagreements += not agrees
+                record["shadows"].append({
+                    "version": version,
+                    "confidence": float(proba),
+                    "predicted_type": predicted_type,
+                    "agrees": agrees,
+                })
+            self._rows[version] += len(rows)
+            self._disagreements[version] += disagreements
+            self._busy[version] += elapsed
+            metrics.SHADOW_ROWS.labels(version).inc(len(rows))
+            metrics.SHADOW_DISAGREEMENTS.labels(version).inc(disagreements)
+            metrics.SHADOW_LATENCY.labels(version).observe(elapsed)
+
+        records = [record for record in records if record["shadows"]]
+        if not records:
+            return
+        try:
+            await db[self.collection].insert_many(records, ordered=False)
+            self.stored += len(records)
+        except Exception:
+            self.errors += 1
+            logger.exception("Storing shadow predictions failed")
+
+    def stats(self) -> dict:
+        from app.executor import executor
+
+        primary_busy = executor.busy_seconds
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "in_flight": len(self._tasks),
+            "sampled": self.sampled,
+            "dropped": self.dropped,
+            "stored": self.stored,
+            "errors": self.errors,
+            "models": {
+                version: {
+                    "rows": self._rows[version],
+                    "disagreement_rate": self._disagreements[version] / self._rows[version]
+                    if self._rows[version] else 0.0,
+                    "avg_row_ms": 1000 * self._busy[version] / self._rows[version] if self._rows[version] else 0.0,
+                    # Shadow CPU time relative to the primary's scoring time
+                    "overhead_ratio": self._busy[version] / primary_busy if primary_busy else 0.0,
+                    "available": version not in self._unavailable,
+                }
+                for version in self.versions
+            },
+        }
+
+    async def close(self):
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+
+shadow = ShadowScorer(
+    versions=settings.SHADOW_MODELS,
+    sample_rate=settings.SHADOW_SAMPLE_RATE,
+    max_pending=settings.SHADOW_MAX_PENDING,
+    workers=settings.SHADOW_WORKERS,
+    collection=settings.SHADOW_COLLECTION,
+)
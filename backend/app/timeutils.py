@@ -0,0 +1,38 @@
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+
+def parse_timestamp(value: Any) -> Optional[datetime]:
+    """
+    Parse a timestamp as sent by devices or stored by older versions
+    (ISO 8601 strings, optionally with a trailing Z) into a naive UTC
+    datetime. Returns None if it isn't a recognisable point in time.
+    """
+    if isinstance(value, datetime):
+        parsed = value
+    elif isinstance(value, str):
+        try:
+            parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    else:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def normalize_timestamp(doc: dict) -> dict:
+    """
+    Store the reading's timestamp as a BSON date. Unparseable values
+    (e.g. the ESP32's millis() counter) are kept as device_timestamp and
+    replaced with the server receive time.
+    """
+    raw = doc.get("timestamp")
+    parsed = parse_timestamp(raw)
+    if parsed is None:
+        if raw is not None:
+            doc["device_timestamp"] = raw
+        parsed = datetime.utcnow()
+    doc["timestamp"] = parsed
+    return doc
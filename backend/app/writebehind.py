@@ -0,0 +1,169 @@
+"""
+Write-behind buffer for ingested events.
+
+With WRITE_BEHIND_ENABLED the sensor endpoints hand scored documents
+(with client-generated ObjectIds) to this buffer and return 202 right
+away. A background task flushes them with insert_many every
+WRITE_BEHIND_FLUSH_MS or WRITE_BEHIND_BATCH documents. If MongoDB is
+unavailable the batch is appended to a local NDJSON spill file, which is
+replayed on the next successful flush and at startup.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from pathlib import Path
+from typing import Deque, List, Optional
+
+from bson import json_util
+from pymongo.errors import BulkWriteError
+
+from app import ingest
+from app.config import settings
+from app.database import db
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY = 11000
+
+
+class WriteBufferFull(Exception):
+    """Raised when the buffer already holds WRITE_BEHIND_MAX_QUEUE documents."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Write buffer is full")
+        self.retry_after = retry_after
+
+
+class WriteBehindBuffer:
+    def __init__(self, max_queue: int, batch_size: int, flush_ms: float, spill_path: Path):
+        self.max_queue = max_queue
+        self.batch_size = max(1, batch_size)
+        self.interval = flush_ms / 1000.0
+        self.spill_path = spill_path
+        self._docs: Deque[dict] = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._flushing: Optional[asyncio.Lock] = None
+        self._stopping = False
+        self.flushed = 0
+        self.spilled = 0
+        self.replayed = 0
+        self.max_depth = 0
+        self.last_flush_ms = 0.0
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._flushing = asyncio.Lock()
+            self._stopping = False
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def put(self, docs: List[dict]):
+        """Queue documents (which must already have an _id) for insertion."""
+        if len(self._docs) + len(docs) > self.max_queue:
+            raise WriteBufferFull(settings.INFERENCE_RETRY_AFTER_S)
+        self.start()
+        self._docs.extend(docs)
+        self.max_depth = max(self.max_depth, len(self._docs))
+        if len(self._docs) >= self.batch_size:
+            self._wakeup.set()
+
+    async def _run(self):
+        await self.replay_spill()
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Write-behind flush failed")
+
+    async def flush(self):
+        async with self._flushing:
+            while self._docs:
+                batch = [self._docs.popleft() for _ in range(min(self.batch_size, len(self._docs)))]
+                if await self._write(batch) and self.spill_path.exists():
+                    await self.replay_spill()
+
+    async def _write(self, batch: List[dict]) -> bool:
+        """Insert a batch; returns False if it had to be spilled."""
+        started = time.perf_counter()
+        failed = set()
+        try:
+            await db.events.insert_many(batch, ordered=False)
+        except BulkWriteError as e:
+            # Duplicates were already written (e.g. by a replayed spill)
+            failed = {err["index"] for err in e.details.get("writeErrors", []) if err.get("code") != DUPLICATE_KEY}
+        except Exception:
+            logger.exception("MongoDB unavailable, spilling %d documents", len(batch))
+            self._spill(batch)
+            return False
+        self.last_flush_ms = 1000 * (time.perf_counter() - started)
+        stored = [doc for n, doc in enumerate(batch) if n not in failed]
+        self.flushed += len(stored)
+        if failed:
+            logger.error("Dropping %d documents rejected by MongoDB", len(failed))
+        await ingest.events_stored(stored)
+        return True
+
+    def _spill(self, docs: List[dict]):
+        with open(self.spill_path, "a") as f:
+            for doc in docs:
+                f.write(json_util.dumps(doc) + "\n")
+        self.spilled += len(docs)
+
+    async def replay_spill(self):
+        """Re-insert documents spilled while MongoDB was unavailable."""
+        if not self.spill_path.exists():
+            return
+        replaying = self.spill_path.with_suffix(self.spill_path.suffix + ".replay")
+        os.replace(self.spill_path, replaying)
+        with open(replaying) as f:
+            docs = [json_util.loads(line) for line in f if line.strip()]
+        os.remove(replaying)
+        for start in range(0, len(docs), self.batch_size):
+            batch = docs[start:start + self.batch_size]
+            if not await self._write(batch):
+                # Still down: put the rest back in the spill file and stop
+                self._spill(docs[start + self.batch_size:])
+                return
+            self.replayed += len(batch)
+
+    async def close(self):
+        """Stop the background task and drain whatever is still queued."""
+        if self._task is not None:
+            # Let the loop finish its current flush rather than cancelling
+            # it between popping a batch and writing (or spilling) it
+            self._stopping = True
+            self._wakeup.set()
+            try:
+                await self._task
+            except Exception:
+                logger.exception("Write-behind task failed")
+            self._task = None
+            await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": settings.WRITE_BEHIND_ENABLED,
+            "depth": len(self._docs),
+            "max_depth": self.max_depth,
+            "max_queue": self.max_queue,
+            "flushed": self.flushed,
+            "spilled": self.spilled,
+            "replayed": self.replayed,
+            "last_flush_ms": self.last_flush_ms,
+        }
+
+
+write_buffer = WriteBehindBuffer(
+    max_queue=settings.WRITE_BEHIND_MAX_QUEUE,
+    batch_size=settings.WRITE_BEHIND_BATCH,
+    flush_ms=settings.WRITE_BEHIND_FLUSH_MS,
+    spill_path=Path(settings.WRITE_BEHIND_SPILL_PATH),
+)
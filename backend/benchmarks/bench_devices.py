@@ -0,0 +1,107 @@
+"""
+GET /api/devices against seeded fleets, cold (cache bypassed) and warm.
+
+The endpoint only reads the materialized `device_stats` collection, so
+by default each fleet is seeded there directly, with counters adding up
+to `events` events. With `seed_events` the events themselves are
+inserted and the summaries rebuilt from them (slow; meant for a real
+mongod).
+"""
+import random
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from bson import ObjectId
+
+from benchmarks.common import ameasure, reset_database, result
+
+FLEETS = [10, 100, 1000]
+INSERT_CHUNK = 10000
+
+
+def _event(device_id: str, timestamp: datetime) -> Dict:
+    return {
+        "_id": ObjectId(),
+        "device_id": device_id,
+        "location": f"Building A - Room {device_id[-3:]}",
+        "timestamp": timestamp,
+        "humidity": random.uniform(30, 70),
+        "pm25": random.uniform(0, 30),
+        "particle_size": random.uniform(200, 350),
+        "volume_spike": random.uniform(40, 80),
+        "predicted_type": "normal",
+        "confidence": random.random(),
+        "verified": False,
+    }
+
+
+async def _seed_stats(devices: int, events: int):
+    from app import device_stats
+    from app.database import db
+
+    now = datetime.utcnow()
+    per_device = events // devices
+    docs = []
+    for i in range(devices):
+        device_id = f"device-{i:04d}"
+        hourly = {
+            (now - timedelta(hours=h)).strftime(device_stats.HOUR_FORMAT): per_device // 720
+            for h in range(device_stats.HOURLY_RETENTION)
+        }
+        latest = _event(device_id, now)
+        docs.append({
+            "_id": device_id,
+            "device_id": device_id,
+            "total_events": per_device,
+            "verified_events": per_device // 50,
+            "hourly": hourly,
+            "last_seen": now,
+            "last_location": latest["location"],
+            "latest_event": latest,
+        })
+    await db.device_stats.insert_many(docs)
+
+
+async def _seed_events(devices: int, events: int):
+    from app import device_stats
+    from app.database import db
+
+    now = datetime.utcnow()
+    for start in range(0, events, INSERT_CHUNK):
+        await db.events.insert_many([
+            _event(f"device-{n % devices:04d}", now - timedelta(seconds=5 * n))
+            for n in range(start, min(events, start + INSERT_CHUNK))
+        ], ordered=False)
+    await device_stats.rebuild()
+
+
+async def run(quick: bool = False, events: int = 1_000_000, seed_events: bool = False) -> List[Dict]:
+    import httpx
+    from app.cache import MemoryBackend, NullBackend, cache
+    from app.main import app
+
+    results = []
+    repeat = 10 if quick else 100
+    original = cache.backend
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        for devices in FLEETS:
+            await reset_database()
+            if seed_events:
+                await _seed_events(devices, events)
+            else:
+                await _seed_stats(devices, events)
+
+            async def get_fleet():
+                response = await client.get("/api/devices/", params={"limit": devices})
+                response.raise_for_status()
+
+            params = {"devices": devices, "events": events}
+            for label, backend in (("cold", NullBackend()), ("warm", MemoryBackend(16))):
+                cache.backend = backend
+                results.append(result(
+                    "devices.list", {**params, "cache": label},
+                    await ameasure(get_fleet, repeat=repeat), unit="req/s",
+                ))
+    cache.backend = original
+    return results
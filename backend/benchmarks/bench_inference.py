@@ -0,0 +1,66 @@
+"""
+Model load time, single-row / batched prediction latency and the
+native (xgboost) vs NumPy tree scorers on the same batches.
+"""
+import random
+from typing import Dict, List
+
+import numpy as np
+
+from benchmarks.common import measure, result
+
+BATCH_SIZES = [1, 16, 64, 256, 1024]
+
+
+def _reading() -> Dict:
+    return {
+        "humidity": random.uniform(20, 70),
+        "pm25": random.uniform(0, 40),
+        "particle_size": random.uniform(200, 400),
+        "volume_spike": random.uniform(40, 80),
+    }
+
+
+def run(quick: bool = False) -> List[Dict]:
+    from app import inference
+    from app.config import settings
+
+    results = []
+    repeat = 20 if quick else 200
+
+    mode = settings.INFERENCE_MODE
+    models = {}
+    for load_mode in ("native", "numpy", "pipeline"):
+        settings.INFERENCE_MODE = load_mode
+        try:
+            timings = measure(inference._load_model, repeat=3 if quick else 10, warmup=1)
+            models[load_mode] = inference._load_model()
+        except RuntimeError:
+            continue  # no exported booster / trees JSON
+        finally:
+            settings.INFERENCE_MODE = mode
+        results.append(result("inference.load_model", {"mode": load_mode}, timings, unit="loads/s"))
+    model = inference.activate()
+
+    reading = _reading()
+    results.append(result(
+        "inference.predict", {"model": model.kind},
+        measure(lambda: inference.predict(reading), repeat=repeat * 5), unit="rows/s",
+    ))
+
+    for size in BATCH_SIZES:
+        rows = [_reading() for _ in range(size)]
+        results.append(result(
+            "inference.predict_batch", {"model": model.kind, "batch_size": size},
+            measure(lambda: inference.predict_batch(rows), repeat=repeat), units=size, unit="rows/s",
+        ))
+        # Scorers side by side on the same matrix (the pipeline is much slower; skip it)
+        for kind, loaded in models.items():
+            if kind == "pipeline":
+                continue
+            X = np.array([loaded.feature_vector(row) for row in rows], dtype=np.float32)
+            results.append(result(
+                "inference.score_matrix", {"model": kind, "batch_size": size},
+                measure(lambda: loaded.score_matrix(X), repeat=repeat), units=size, unit="rows/s",
+            ))
+    return results
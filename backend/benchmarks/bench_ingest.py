@@ -0,0 +1,56 @@
+"""
+POST /api/sensors/data and /batch throughput, with the FastAPI app
+in-process (httpx ASGI transport, no network).
+"""
+import random
+from typing import Dict, List
+
+from benchmarks.common import ameasure_concurrent, reset_database, result
+
+CONCURRENCY = [1, 16, 64]
+BATCH_ROWS = 100
+
+
+def _reading(device_id: str) -> Dict:
+    vape = random.random() < 0.1
+    return {
+        "device_id": device_id,
+        "humidity": random.uniform(30, 45) if vape else random.uniform(30, 70),
+        "pm25": random.uniform(15, 30) if vape else random.uniform(0, 30),
+        "particle_size": random.uniform(280, 350) if vape else random.uniform(200, 350),
+        "volume_spike": random.uniform(60, 80) if vape else random.uniform(40, 80),
+    }
+
+
+async def run(quick: bool = False) -> List[Dict]:
+    import httpx
+    from app.main import app
+
+    results = []
+    total = 200 if quick else 2000
+    devices = [f"bench-{i:04d}" for i in range(100)]
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        async def post_one():
+            response = await client.post("/api/sensors/data", json=_reading(random.choice(devices)))
+            response.raise_for_status()
+
+        async def post_batch():
+            device_id = random.choice(devices)
+            response = await client.post("/api/sensors/batch", json=[_reading(device_id) for _ in range(BATCH_ROWS)])
+            response.raise_for_status()
+
+        for concurrency in CONCURRENCY:
+            await reset_database()
+            timings, wall = await ameasure_concurrent(post_one, total, concurrency)
+            results.append(result(
+                "ingest.post_data", {"concurrency": concurrency}, timings, unit="req/s", wall=wall,
+            ))
+
+        await reset_database()
+        timings, wall = await ameasure_concurrent(post_batch, max(10, total // BATCH_ROWS * 2), 4)
+        results.append(result(
+            "ingest.post_batch", {"rows": BATCH_ROWS, "concurrency": 4}, timings,
+            units=BATCH_ROWS, unit="rows/s", wall=wall,
+        ))
+    return results
@@ -0,0 +1,199 @@
+"""
+Cold-start measurement: what a fresh process (a serverless function
+instance) pays before it can answer.
+
+    cd backend
+    python -m benchmarks.cold_start                      # auto and numpy scorers, 5 runs each
+    python -m benchmarks.cold_start --modes numpy --runs 10 --top 20
+    python -m benchmarks.cold_start --compare benchmarks/results/coldstart-<earlier>.json
+
+Every run is a new interpreter started with `-X importtime` and the
+serverless settings from vercel.json. It times `import app.main`, the
+app's startup (lifespan) plus the first /health/live request, loading
+the model and the first scoring call, and records peak RSS after each
+phase. The import-time breakdown (self time per top-level package, per
+phase) comes from the interpreter's own importtime log. MongoDB is never
+contacted: the client is created lazily and neither startup (with
+ENSURE_INDEXES_ON_STARTUP off) nor the route touches it.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+
+from benchmarks.common import result
+
+BACKEND_DIR = Path(__file__).parent.parent
+RESULTS_DIR = Path(__file__).parent / "results"
+PHASE_MARKER = "## phase "
+# Imports that should stay off the cold path of non-scoring routes
+HEAVY = ["xgboost", "sklearn", "scipy", "pandas", "joblib", "category_encoders", "motor"]
+
+CHILD = f"""
+import json, resource, sys, time
+
+def rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def phase(name):
+    sys.stderr.write("{PHASE_MARKER}" + name + "\\n")
+    sys.stderr.flush()
+
+out = {{}}
+phase("import")
+started = time.perf_counter()
+import app.main
+out["import_s"] = time.perf_counter() - started
+out["import_rss_mb"] = rss_mb()
+out["heavy_after_import"] = sorted({{m.split(".")[0] for m in sys.modules}} & set({HEAVY!r}))
+
+phase("first_request")
+import asyncio, httpx
+async def first_request():
+    transport = httpx.ASGITransport(app=app.main.app)
+    started = time.perf_counter()
+    # ASGITransport doesn't send lifespan events; run startup as the server would
+    async with app.main.app.router.lifespan_context(app.main.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://cold") as client:
+            response = await client.get("/health/live")
+            response.raise_for_status()
+            return time.perf_counter() - started
+out["first_request_s"] = asyncio.run(first_request())
+
+phase("model_load")
+from app import inference
+started = time.perf_counter()
+model = inference.current()
+out["model_load_s"] = time.perf_counter() - started
+out["model_kind"] = model.kind
+out["model_rss_mb"] = rss_mb()
+
+phase("first_score")
+started = time.perf_counter()
+inference.predict({{"humidity": 35, "pm25": 25, "particle_size": 300, "volume_spike": 70}})
+out["first_score_s"] = time.perf_counter() - started
+print(json.dumps(out))
+"""
+
+
+def _parse_importtime(stderr: str) -> Dict[str, Dict[str, float]]:
+    """Self time (ms) per top-level package, per phase."""
+    phases: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+    current = "startup"
+    for line in stderr.splitlines():
+        if line.startswith(PHASE_MARKER):
+            current = line[len(PHASE_MARKER):].strip()
+            continue
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        phases[current][name.strip().split(".")[0]] += int(self_us) / 1000
+    return {phase: dict(packages) for phase, packages in phases.items()}
+
+
+def run_once(mode: str) -> Dict:
+    env = {
+        **os.environ,
+        "MONGODB_URI": os.environ.get("MONGODB_URI", "mongodb://localhost:27017"),
+        "INFERENCE_MODE": mode,
+        # As deployed on Vercel: nothing loaded or contacted at startup
+        "MODEL_PRELOAD": "false",
+        "MODEL_WATCH_INTERVAL_S": "0",
+        "ENSURE_INDEXES_ON_STARTUP": "false",
+    }
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHILD],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"Cold-start run failed ({mode}):\n{proc.stderr[-2000:]}")
+    out = json.loads(proc.stdout.strip().splitlines()[-1])
+    out["imports_ms"] = _parse_importtime(proc.stderr)
+    return out
+
+
+def summarize(mode: str, runs: List[Dict]) -> List[Dict]:
+    params = {"mode": mode, "model": runs[0]["model_kind"]}
+    records = []
+    for phase in ("import", "first_request", "model_load", "first_score"):
+        record = result(f"coldstart.{phase}", params, [r[f"{phase}_s"] for r in runs], unit="runs/s")
+        if phase == "import":
+            record["rss_mb"] = round(statistics.median(r["import_rss_mb"] for r in runs), 1)
+            record["heavy_modules"] = runs[0]["heavy_after_import"]
+        if phase == "model_load":
+            record["rss_mb"] = round(statistics.median(r["model_rss_mb"] for r in runs), 1)
+        records.append(record)
+    return records
+
+
+def breakdown(runs: List[Dict], top: int) -> Dict[str, List]:
+    """Median self time per package, heaviest first, for each phase."""
+    phases = {}
+    for phase in runs[0]["imports_ms"]:
+        packages = defaultdict(list)
+        for r in runs:
+            for package, ms in r["imports_ms"].get(phase, {}).items():
+                packages[package].append(ms)
+        ranked = sorted(((p, statistics.median(v)) for p, v in packages.items()), key=lambda x: -x[1])
+        phases[phase] = [[package, round(ms, 1)] for package, ms in ranked[:top]]
+    return phases
+
+
+def print_report(report: Dict, baseline: Dict = None):
+    from benchmarks.run import print_results
+
+    print_results(report, baseline)
+    for record in report["results"]:
+        if "rss_mb" in record:
+            print(f"  {record['name']:<24} mode={record['params']['mode']:<8} peak RSS {record['rss_mb']:>7.1f} MB"
+                  + (f"  heavy: {', '.join(record['heavy_modules']) or 'none'}" if "heavy_modules" in record else ""))
+    for mode, phases in report["imports"].items():
+        print(f"\nImport time by package, mode={mode} (median self ms)")
+        for phase, packages in phases.items():
+            total = sum(ms for _, ms in packages)
+            print(f"  {phase:<14} " + ", ".join(f"{p} {ms:.0f}" for p, ms in packages) + f"  (top total {total:.0f})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold-start time, memory and import cost")
+    parser.add_argument("--modes", type=lambda s: s.split(","), default=["auto", "numpy"],
+                        help="Comma-separated INFERENCE_MODE values to compare (default: auto,numpy)")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh processes per mode (default: 5)")
+    parser.add_argument("--top", type=int, default=12, help="Packages listed per phase in the breakdown")
+    parser.add_argument("--output", type=Path, help="Results file (default: benchmarks/results/coldstart-<timestamp>.json)")
+    parser.add_argument("--compare", type=Path, help="Earlier cold-start results file to compare against")
+    args = parser.parse_args()
+
+    report = {
+        "environment": {
+            "timestamp": datetime.utcnow().isoformat(),
+            "python": sys.version.split()[0],
+            "cpus": os.cpu_count(),
+            "runs": args.runs,
+        },
+        "results": [],
+        "imports": {},
+    }
+    for mode in args.modes:
+        print(f"Measuring cold starts, INFERENCE_MODE={mode}...")
+        runs = [run_once(mode) for _ in range(args.runs)]
+        report["results"] += summarize(mode, runs)
+        report["imports"][mode] = breakdown(runs, args.top)
+
+    output = args.output or RESULTS_DIR / f"coldstart-{datetime.utcnow():%Y%m%dT%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+
+    baseline = json.loads(args.compare.read_text()) if args.compare else None
+    print_report(report, baseline)
+    print(f"\nResults written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Shared helpers for the benchmark suite: database setup, timing and
+result records.
+"""
+import asyncio
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+BENCH_DATABASE = "vapeDB_bench"
+
+
+def setup_database(mongo_uri: Optional[str]) -> str:
+    """
+    Point the app at a benchmark database before any router imports it:
+    a local mongod if `mongo_uri` is given, otherwise mongomock-motor
+    in-process. Returns a label for the results file.
+    """
+    os.environ.setdefault("MONGODB_URI", mongo_uri or "mongodb://localhost:27017")
+    if mongo_uri:
+        os.environ["MONGODB_URI"] = mongo_uri
+        os.environ["DATABASE_NAME"] = BENCH_DATABASE
+        return "mongod"
+
+    import mongomock.collection
+    from mongomock_motor import AsyncMongoMockClient
+
+    # Newer pymongo passes `sort` to bulk update ops, which mongomock's
+    # bulk builder doesn't accept yet
+    for name in ("add_update", "add_replace", "add_delete"):
+        original = getattr(mongomock.collection.BulkOperationBuilder, name)
+
+        def without_sort(self, *args, _original=original, **kwargs):
+            kwargs.pop("sort", None)
+            return _original(self, *args, **kwargs)
+
+        setattr(mongomock.collection.BulkOperationBuilder, name, without_sort)
+
+    from app import database
+    database.client = AsyncMongoMockClient()
+    database.db = database.client[BENCH_DATABASE]
+    return "mongomock"
+
+
+async def reset_database():
+    from app import database
+    for name in await database.db.list_collection_names():
+        await database.db.drop_collection(name)
+
+
+def result(name: str, params: Dict, timings: List[float], units: float = 1, unit: str = "ops/s",
+           wall: Optional[float] = None) -> Dict:
+    """
+    Summarize per-sample wall times (seconds) into one result record.
+    Pass `wall` when samples ran concurrently, so throughput is over the
+    elapsed time rather than the sum of latencies.
+    """
+    ms = np.array(timings) * 1000
+    return {
+        "name": name,
+        "params": params,
+        "samples": len(timings),
+        "mean_ms": round(float(ms.mean()), 4),
+        "p50_ms": round(float(np.percentile(ms, 50)), 4),
+        "p95_ms": round(float(np.percentile(ms, 95)), 4),
+        "p99_ms": round(float(np.percentile(ms, 99)), 4),
+        "min_ms": round(float(ms.min()), 4),
+        "throughput": round(units * len(timings) / (wall or sum(timings)), 2),
+        "unit": unit,
+    }
+
+
+def measure(fn: Callable, repeat: int, warmup: int = 3) -> List[float]:
+    for _ in range(warmup):
+        fn()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+async def ameasure(fn: Callable[[], Awaitable], repeat: int, warmup: int = 3) -> List[float]:
+    for _ in range(warmup):
+        await fn()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await fn()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+async def ameasure_concurrent(fn: Callable[[], Awaitable], total: int, concurrency: int) -> Tuple[List[float], float]:
+    """Run `fn` `total` times from `concurrency` workers; returns (latencies, wall time)."""
+    timings = []
+    remaining = iter(range(total))
+
+    async def worker():
+        for _ in remaining:
+            started = time.perf_counter()
+            await fn()
+            timings.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return timings, time.perf_counter() - started
+
+
+def environment(backend: str) -> Dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    from app import inference
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        "commit": commit,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "database": backend,
+        "model": inference.current().kind,
+    }
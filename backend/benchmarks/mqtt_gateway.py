@@ -0,0 +1,150 @@
+"""
+End-to-end check of the MQTT gateway against a real local broker.
+
+    cd backend
+    mosquitto -p 1883 &
+    python -m benchmarks.mqtt_gateway                          # 2,000 readings from 20 devices
+    python -m benchmarks.mqtt_gateway --fail-every 3           # also inject lost MongoDB replies
+    python -m benchmarks.mqtt_gateway --mongo-uri mongodb://localhost:27017
+
+The gateway runs in-process (mongomock unless --mongo-uri) and a paho
+publisher sends one QoS 1 JSON reading per message, tagged with a
+sequence number. With --fail-every N, every Nth events insert is carried
+out and then fails with AutoReconnect, as if the reply was lost, so the
+batch is retried after a partial write. The run passes when every
+reading was acknowledged and stored exactly once; it prints the
+throughput and gateway counters and exits non-zero otherwise. Brokers
+without shared subscriptions need MQTT_SHARED_GROUP="".
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+from benchmarks.common import reset_database, setup_database
+
+
+def _reading(device_id: str, seq: int) -> dict:
+    vape = random.random() < 0.1
+    return {
+        "device_id": device_id,
+        "seq": seq,
+        "humidity": random.uniform(30, 45) if vape else random.uniform(30, 70),
+        "pm25": random.uniform(15, 30) if vape else random.uniform(0, 30),
+        "particle_size": random.uniform(280, 350) if vape else random.uniform(200, 350),
+        "volume_spike": random.uniform(60, 80) if vape else random.uniform(40, 80),
+    }
+
+
+def _inject_failures(every: int):
+    """Make every `every`th events insert_many succeed, then raise as if the reply was lost."""
+    from pymongo.errors import AutoReconnect
+
+    from app import database, pipeline
+
+    events = database.db.events
+    original = events.insert_many
+    calls = {"n": 0}
+
+    async def insert_many(*args, **kwargs):
+        result = await original(*args, **kwargs)
+        calls["n"] += 1
+        if calls["n"] % every == 0:
+            raise AutoReconnect("injected: reply lost after the write")
+        return result
+
+    class Events:
+        def __getattr__(self, name):
+            return insert_many if name == "insert_many" else getattr(events, name)
+
+    class Database:
+        def __getattr__(self, name):
+            return Events() if name == "events" else getattr(database.db, name)
+
+        def __getitem__(self, name):
+            return Events() if name == "events" else database.db[name]
+
+    pipeline.db = Database()
+
+
+async def run(args) -> bool:
+    import orjson
+    import paho.mqtt.client as mqtt
+
+    from app import database
+    from app.config import settings
+    from app.mqtt import gateway
+
+    await reset_database()
+    if args.fail_every:
+        _inject_failures(args.fail_every)
+    settings.MQTT_HOST, settings.MQTT_PORT = args.host, args.port
+    settings.MQTT_RETRY_S = 0.05
+    await gateway.start()
+    for _ in range(100):
+        if gateway.connected:
+            break
+        await asyncio.sleep(0.05)
+    else:
+        print(f"Could not connect to the broker at {args.host}:{args.port}")
+        await gateway.stop()
+        return False
+    # Let the subscription settle before publishing
+    await asyncio.sleep(0.5)
+
+    publisher = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=f"bench-publisher-{os.getpid()}")
+    publisher.connect(args.host, args.port)
+    publisher.loop_start()
+    devices = [f"bench-{i:04d}" for i in range(args.devices)]
+    started = time.perf_counter()
+    for seq in range(args.readings):
+        device_id = devices[seq % len(devices)]
+        publisher.publish(f"{gateway.prefix}/{device_id}/readings", orjson.dumps(_reading(device_id, seq)), qos=1)
+
+    deadline = time.monotonic() + args.timeout
+    while gateway.acked < args.readings and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+    elapsed = time.perf_counter() - started
+    publisher.disconnect()
+    publisher.loop_stop()
+    await gateway.stop()
+
+    seqs = [doc["seq"] async for doc in database.db.events.find({}, {"seq": 1})]
+    stored, distinct = len(seqs), len(set(seqs))
+    stats = gateway.stats()
+    print(f"Published {args.readings:,} readings from {args.devices} devices in {elapsed:.2f}s "
+          f"({args.readings / elapsed:,.0f} readings/s end to end)")
+    print(f"Gateway: {', '.join(f'{k}={v}' for k, v in stats.items())}")
+    print(f"Stored {stored:,} events for {distinct:,} distinct readings")
+    ok = gateway.acked == args.readings and stored == distinct == args.readings
+    print("OK: every reading stored exactly once" if ok else "FAILED: readings lost or duplicated")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the MQTT gateway end to end against a local broker")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1883)
+    parser.add_argument("--readings", type=int, default=2000)
+    parser.add_argument("--devices", type=int, default=20)
+    parser.add_argument("--fail-every", type=int, default=0,
+                        help="Fail every Nth events insert after it wrote (default: 0, no faults)")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Seconds to wait for every ack")
+    parser.add_argument("--mongo-uri", help="Use this mongod instead of mongomock")
+    args = parser.parse_args()
+
+    # One event per reading, written straight away
+    os.environ["STORAGE_MODE"] = "events"
+    os.environ["INCIDENTS_ENABLED"] = "false"
+    os.environ["WRITE_BEHIND_ENABLED"] = "false"
+    os.environ["SENSOR_EXTRA_FIELDS"] = "keep"
+    os.environ["MQTT_TOPIC_PREFIX"] = f"bench-{os.getpid()}"
+    os.environ["MQTT_CLIENT_ID"] = f"bench-gateway-{os.getpid()}"
+    setup_database(args.mongo_uri)
+    sys.exit(0 if asyncio.run(run(args)) else 1)
+
+
+if __name__ == "__main__":
+    main()
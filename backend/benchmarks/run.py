@@ -0,0 +1,88 @@
+"""
+Run the backend benchmark suite and write a machine-readable results file.
+
+    cd backend
+    python -m benchmarks.run                       # everything, in-process mongomock
+    python -m benchmarks.run --only inference --quick
+    python -m benchmarks.run --mongo-uri mongodb://localhost:27017
+    python -m benchmarks.run --compare benchmarks/results/<earlier>.json
+
+Results go to benchmarks/results/<timestamp>.json unless --output is
+given. Each record has a name, its params, latency percentiles and a
+throughput; --compare prints the change against an earlier file.
+With --mongo-uri the suite uses (and drops) the `vapeDB_bench` database.
+"""
+import argparse
+import asyncio
+import json
+from datetime import datetime
+from pathlib import Path
+
+from benchmarks import common
+
+RESULTS_DIR = Path(__file__).parent / "results"
+SUITES = ["inference", "ingest", "devices"]
+
+
+async def _run(args, backend: str) -> dict:
+    from benchmarks import bench_devices, bench_inference, bench_ingest
+
+    results = []
+    if "inference" in args.only:
+        print("Running inference benchmarks...")
+        results += bench_inference.run(args.quick)
+    if "ingest" in args.only:
+        print("Running ingest benchmarks...")
+        results += await bench_ingest.run(args.quick)
+    if "devices" in args.only:
+        print("Running device list benchmarks...")
+        results += await bench_devices.run(args.quick, events=args.events, seed_events=args.seed_events)
+    if backend == "mongod":
+        await common.reset_database()
+    return {"environment": common.environment(backend), "results": results}
+
+
+def _key(record: dict) -> str:
+    return record["name"] + json.dumps(record["params"], sort_keys=True)
+
+
+def print_results(report: dict, baseline: dict = None):
+    before = {_key(r): r for r in (baseline or {}).get("results", [])}
+    for record in report["results"]:
+        params = ", ".join(f"{k}={v}" for k, v in record["params"].items())
+        line = (f"{record['name']:<24} {params:<42} p50 {record['p50_ms']:>9.3f} ms  "
+                f"p99 {record['p99_ms']:>9.3f} ms  {record['throughput']:>11.1f} {record['unit']}")
+        old = before.get(_key(record))
+        if old:
+            change = (record["p50_ms"] - old["p50_ms"]) / old["p50_ms"] * 100 if old["p50_ms"] else 0.0
+            line += f"  (p50 {change:+.1f}%)"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark inference, ingest and read paths")
+    parser.add_argument("--only", type=lambda s: s.split(","), default=SUITES,
+                        help=f"Comma-separated subset of {','.join(SUITES)}")
+    parser.add_argument("--quick", action="store_true", help="Fewer iterations (smoke run)")
+    parser.add_argument("--mongo-uri", help="Benchmark against this mongod instead of mongomock")
+    parser.add_argument("--events", type=int, default=1_000_000, help="Events per seeded fleet (default: 1,000,000)")
+    parser.add_argument("--seed-events", action="store_true",
+                        help="Insert the events themselves and rebuild device_stats (use with --mongo-uri)")
+    parser.add_argument("--output", type=Path, help="Results file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", type=Path, help="Earlier results file to compare against")
+    args = parser.parse_args()
+
+    backend = common.setup_database(args.mongo_uri)
+    report = asyncio.run(_run(args, backend))
+
+    output = args.output or RESULTS_DIR / f"{datetime.utcnow():%Y%m%dT%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+
+    baseline = json.loads(args.compare.read_text()) if args.compare else None
+    print_results(report, baseline)
+    print(f"\nResults written to {output}")
+
+
+if __name__ == "__main__":
+    main()
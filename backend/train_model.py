@@ -1,56 +1,536 @@
-import pandas as pd
+"""
+Train, evaluate and export the vape detection model.
+
+    cd backend
+    python train_model.py                          # default params, 1,000 simulated rows
+    python train_model.py --samples 2000000 --search 20 --jobs 8
+    python train_model.py --temporal               # per-device streams + app.features rolling features
+    python train_model.py --data events.parquet --label verified  # data from GET /api/events/export
+
+Datasets are built as NumPy arrays and the model uses XGBoost's `hist`
+tree method with early stopping on a validation slice. `--search` runs
+a random hyperparameter search with every (candidate, fold) pair fitted
+in parallel. The held-out test set gets a ROC AUC with a bootstrap
+confidence interval computed for all resamples at once.
+
+`--data` trains on exports instead of simulated rows (NDJSON, CSV or
+Parquet, as written by GET /api/events/export). Files are read row by
+row, or one row group at a time for Parquet. Only the feature and label
+columns are kept, so memory grows with the row count and not with the
+file size. `--label` names the field holding the ground truth.
+
+Each run adds a version to the model registry (models/registry/<version>/:
+model.ubj, model.json, model.joblib, metadata.json, report.json). --activate points
+CURRENT at it and running workers hot-swap to it; otherwise roll it out
+later with POST /api/models/<version>/activate.
+"""
+import argparse
+import csv
+import json
+import os
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
 import numpy as np
-from sklearn.model_selection import train_test_split
-from sklearn.pipeline import Pipeline
-from category_encoders import TargetEncoder
-from xgboost import XGBClassifier
-import joblib
-
-# 1) Simulate the realistic dataset
-np.random.seed(8)
-n_samples = 1000
-fire_rate = 0.15
-n_fire = int(n_samples * fire_rate)
-n_normal = n_samples - n_fire
-
-normal_data = {
-    'humidity': np.random.normal(50, 7, n_normal).clip(30, 70),
-    'pm25': np.random.normal(10, 4, n_normal).clip(0, 30),
-    'particle_size': np.random.normal(210, 40, n_normal).clip(120, 300),
-    'volume_spike': np.random.normal(45, 12, n_normal).clip(20, 70),
-    'result': np.zeros(n_normal)
+
+BASE_FEATURES = ['humidity', 'pm25', 'particle_size', 'volume_spike']
+MODELS_DIR = Path(__file__).parent / 'models'
+
+DEFAULT_PARAMS = {
+    'max_depth': 6,
+    'learning_rate': 0.1,
+    'subsample': 1.0,
+    'colsample_bytree': 1.0,
+    'colsample_bylevel': 1.0,
+    'colsample_bynode': 1.0,
+    'reg_alpha': 0.0,
+    'reg_lambda': 1.0,
+    'gamma': 0.0,
 }
-fire_data = {
-    'humidity': np.random.normal(35, 7, n_fire).clip(15, 60),
-    'pm25': np.random.normal(25, 6, n_fire).clip(10, 45),
-    'particle_size': np.random.normal(300, 40, n_fire).clip(180, 400),
-    'volume_spike': np.random.normal(70, 12, n_fire).clip(40, 100),
-    'result': np.ones(n_fire)
+
+# (low, high, log-uniform) per hyperparameter; max_depth is an integer
+SEARCH_SPACE = {
+    'max_depth': (2, 8, False),
+    'learning_rate': (0.001, 1.0, True),
+    'subsample': (0.5, 1.0, False),
+    'colsample_bytree': (0.5, 1.0, False),
+    'colsample_bylevel': (0.5, 1.0, False),
+    'colsample_bynode': (0.5, 1.0, False),
+    'reg_alpha': (0.0, 10.0, False),
+    'reg_lambda': (0.0, 10.0, False),
+    'gamma': (0.0, 10.0, False),
 }
 
-df = pd.concat([pd.DataFrame(normal_data), pd.DataFrame(fire_data)], ignore_index=True)
-# 5% label noise
-noise_idx = np.random.choice(df.index, size=int(0.05 * n_samples), replace=False)
-df.loc[noise_idx, 'result'] = 1 - df.loc[noise_idx, 'result']
-df = df.sample(frac=1, random_state=8).reset_index(drop=True)
-
-# 2) Split
-X = df.drop(columns=['result'])
-y = df['result']
-X_train, X_test, y_train, y_test = train_test_split(X, y, stratify=y, test_size=0.2, random_state=8)
-
-# 3) Build pipeline & train
-pipe = Pipeline([
-    ('encoder', TargetEncoder(cols=[])),
-    ('clf', XGBClassifier(
-        random_state=8,
-        use_label_encoder=False,
-        eval_metric='logloss'
-    ))
-])
-# For simplicity, just fit default params here (you can replace with BayesSearchCV later)
-pipe.fit(X_train, y_train)
-
-# 4) Serialize the trained pipeline (includes encoder + model)
-joblib.dump(pipe, 'models/xgb_model.joblib')
-print("Model trained and saved to backend/models/xgb_model.joblib")
+
+# --- data --------------------------------------------------------------
+
+def simulate(n_samples: int, fire_rate: float, noise: float, seed: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Simulated readings with overlapping normal/vape distributions and label noise."""
+    rng = np.random.default_rng(seed)
+    n_fire = int(n_samples * fire_rate)
+    n_normal = n_samples - n_fire
+
+    def block(n, humidity, pm25, particle_size, volume_spike):
+        return np.column_stack([
+            rng.normal(*humidity[:2], n).clip(*humidity[2:]),
+            rng.normal(*pm25[:2], n).clip(*pm25[2:]),
+            rng.normal(*particle_size[:2], n).clip(*particle_size[2:]),
+            rng.normal(*volume_spike[:2], n).clip(*volume_spike[2:]),
+        ])
+
+    X = np.vstack([
+        block(n_normal, (50, 7, 30, 70), (10, 4, 0, 30), (210, 40, 120, 300), (45, 12, 20, 70)),
+        block(n_fire, (35, 7, 15, 60), (25, 6, 10, 45), (300, 40, 180, 400), (70, 12, 40, 100)),
+    ]).astype(np.float32)
+    y = np.concatenate([np.zeros(n_normal, dtype=np.int8), np.ones(n_fire, dtype=np.int8)])
+
+    flip = rng.choice(n_samples, size=int(noise * n_samples), replace=False)
+    y[flip] = 1 - y[flip]
+    order = rng.permutation(n_samples)
+    return X[order], y[order]
+
+
+def simulate_streams(n_samples: int, fire_rate: float, noise: float, seed: int,
+                     devices: int = 20, burst_length: float = 6.0) -> Tuple[np.ndarray, np.ndarray, List[str]]:
+    """
+    Time-ordered readings from `devices` rooms, each with its own
+    baseline, where vaping shows up as bursts of consecutive readings
+    (pm25, sound and humidity rise, gas resistance drops). They are
+    replayed through app.features exactly as the ingest path would see
+    them, so the rolling features carry real signal.
+    """
+    from app.features import TEMPORAL_FEATURES, rolling_features
+
+    rng = np.random.default_rng(seed)
+    humidity = rng.uniform(35, 60, devices)
+    pm25 = rng.uniform(4, 14, devices)
+    particle_size = rng.uniform(190, 230, devices)
+    sound_level = rng.uniform(35, 50, devices)
+    gas_resistance = rng.uniform(40, 60, devices)
+    # Bursts start often enough that about fire_rate of readings are in one
+    start_rate = fire_rate / (burst_length * max(1e-6, 1 - fire_rate))
+    remaining = np.zeros(devices, dtype=np.int64)
+
+    readings, labels = [], []
+    while len(readings) < n_samples:
+        for d in range(min(devices, n_samples - len(readings))):
+            if remaining[d] == 0 and rng.random() < start_rate:
+                remaining[d] = rng.geometric(1 / burst_length)
+            vape = remaining[d] > 0
+            remaining[d] -= vape
+            sound = rng.normal(sound_level[d] + 20 * vape, 8)
+            readings.append({
+                'device_id': f'room-{d}',
+                'humidity': float(np.clip(rng.normal(humidity[d] - 8 * vape, 4), 10, 90)),
+                'pm25': float(max(0.0, rng.normal(pm25[d] + 14 * vape, 4))),
+                'particle_size': float(rng.normal(300 if vape else particle_size[d], 35)),
+                'volume_spike': float(max(0.0, sound + rng.normal(0, 5))),
+                'sound_level': float(sound),
+                'gas_resistance': float(gas_resistance[d] * rng.normal(0.65 if vape else 1.0, 0.05)),
+            })
+            labels.append(int(vape))
+
+    y = np.array(labels, dtype=np.int8)
+    flip = rng.choice(n_samples, size=int(noise * n_samples), replace=False)
+    y[flip] = 1 - y[flip]
+    features = BASE_FEATURES + TEMPORAL_FEATURES
+    X = np.array(
+        [[r[name] for name in BASE_FEATURES] + [f[name] for name in TEMPORAL_FEATURES]
+         for r, f in zip(readings, rolling_features(readings))],
+        dtype=np.float32,
+    )
+    return X, y, features
+
+
+def _cell(value) -> float:
+    """A feature value from an export cell; missing or non-numeric is NaN."""
+    if value is None or isinstance(value, (dict, list)):
+        return np.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        if isinstance(value, str):
+            return {'true': 1.0, 'false': 0.0}.get(value.strip().lower(), np.nan)
+        return np.nan
+
+
+def _label(value) -> Optional[int]:
+    if isinstance(value, str):
+        value = value.strip().lower()
+        if value in ('true', 'yes', 'vape'):
+            return 1
+        if value in ('false', 'no', 'normal'):
+            return 0
+    value = _cell(value)
+    return None if np.isnan(value) else int(value >= 0.5)
+
+
+def _export_rows(path: Path, columns: List[str]) -> Iterator[dict]:
+    suffix = path.suffix.lower()
+    if suffix in ('.ndjson', '.jsonl', '.json'):
+        with open(path, 'rb') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    elif suffix == '.csv':
+        with open(path, newline='') as f:
+            yield from csv.DictReader(f)
+    elif suffix == '.parquet':
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit('Reading Parquet exports requires pyarrow')
+        data = pq.ParquetFile(path)
+        present = [name for name in columns if name in data.schema_arrow.names]
+        for batch in data.iter_batches(columns=present):
+            yield from batch.to_pylist()
+    else:
+        raise SystemExit(f'Unknown export format: {path} (expected .ndjson, .csv or .parquet)')
+
+
+def read_exports(paths: List[Path], features: List[str], label: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Feature matrix and labels from exported events; rows without a label are skipped."""
+    values, labels = array('f'), array('b')
+    for path in paths:
+        for row in _export_rows(path, features + [label]):
+            target = _label(row.get(label))
+            if target is None:
+                continue
+            values.extend(_cell(row.get(name)) for name in features)
+            labels.append(target)
+    X = np.frombuffer(values, dtype=np.float32).reshape(-1, len(features))
+    return X, np.frombuffer(labels, dtype=np.int8)
+
+
+def stratified_split(y: np.ndarray, size: float, rng: np.random.Generator) -> Tuple[np.ndarray, np.ndarray]:
+    """Index arrays (rest, held_out) with `size` of each class held out."""
+    held = []
+    for cls in np.unique(y):
+        idx = rng.permutation(np.flatnonzero(y == cls))
+        held.append(idx[:int(round(len(idx) * size))])
+    held = np.sort(np.concatenate(held))
+    mask = np.ones(len(y), dtype=bool)
+    mask[held] = False
+    return np.flatnonzero(mask), held
+
+
+def stratified_folds(y: np.ndarray, k: int, rng: np.random.Generator) -> List[Tuple[np.ndarray, np.ndarray]]:
+    fold_of = np.empty(len(y), dtype=np.int32)
+    for cls in np.unique(y):
+        idx = rng.permutation(np.flatnonzero(y == cls))
+        fold_of[idx] = np.arange(len(idx)) % k
+    return [(np.flatnonzero(fold_of != f), np.flatnonzero(fold_of == f)) for f in range(k)]
+
+
+# --- metrics -----------------------------------------------------------
+
+def _weighted_auc(scores: np.ndarray, y: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """
+    Rank-based (Mann-Whitney) ROC AUC for each row of `weights`, where a
+    row gives how many times each sample occurs. Ties count one half.
+    Rows with a single class come back as NaN.
+    """
+    order = np.argsort(scores, kind='mergesort')
+    s, positive = scores[order], y[order] == 1
+    w = weights[:, order]
+    starts = np.flatnonzero(np.r_[True, s[1:] != s[:-1]])
+
+    pos = np.add.reduceat(np.where(positive, w, 0), starts, axis=1)
+    neg = np.add.reduceat(np.where(positive, 0, w), starts, axis=1)
+    neg_below = np.cumsum(neg, axis=1) - neg
+    n_pos, n_neg = pos.sum(axis=1), neg.sum(axis=1)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (pos * (neg_below + 0.5 * neg)).sum(axis=1) / (n_pos * n_neg)
+
+
+def roc_auc(scores: np.ndarray, y: np.ndarray) -> float:
+    return float(_weighted_auc(scores, y, np.ones((1, len(y)), dtype=np.float32))[0])
+
+
+def bootstrap_auc(scores: np.ndarray, y: np.ndarray, n_bootstraps: int = 1000, interval: float = 95,
+                  seed: int = 42, max_cells: int = 50_000_000) -> Dict:
+    """
+    Percentile bootstrap CI for ROC AUC. Resamples are drawn as one index
+    matrix per chunk and turned into per-sample counts, so every AUC in
+    the chunk comes out of the same sort and cumulative sums.
+    """
+    rng = np.random.default_rng(seed)
+    n = len(y)
+    chunk = max(1, min(n_bootstraps, max_cells // max(n, 1)))
+    aucs = []
+    for start in range(0, n_bootstraps, chunk):
+        rows = min(chunk, n_bootstraps - start)
+        idx = rng.integers(0, n, size=(rows, n)) + (np.arange(rows) * n)[:, None]
+        counts = np.bincount(idx.ravel(), minlength=rows * n).reshape(rows, n).astype(np.float32)
+        aucs.append(_weighted_auc(scores, y, counts))
+    aucs = np.concatenate(aucs)
+    # Resamples with only one class have no AUC
+    aucs = aucs[~np.isnan(aucs)]
+    tail = (100 - interval) / 2
+    return {
+        'interval': interval,
+        'lower': float(np.percentile(aucs, tail)),
+        'upper': float(np.percentile(aucs, 100 - tail)),
+        'bootstraps': int(len(aucs)),
+    }
+
+
+def threshold_report(scores: np.ndarray, y: np.ndarray, threshold: float) -> Dict:
+    predicted = scores >= threshold
+    actual = y == 1
+    tp = int(np.sum(predicted & actual))
+    fp = int(np.sum(predicted & ~actual))
+    fn = int(np.sum(~predicted & actual))
+    tn = int(np.sum(~predicted & ~actual))
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {
+        'threshold': threshold,
+        'precision': precision,
+        'recall': recall,
+        'f1': f1,
+        'confusion': {'tp': tp, 'fp': fp, 'fn': fn, 'tn': tn},
+    }
+
+
+# --- training ----------------------------------------------------------
+
+def make_classifier(params: Dict, args, threads: int):
+    from xgboost import XGBClassifier
+
+    return XGBClassifier(
+        **params,
+        n_estimators=args.max_rounds,
+        early_stopping_rounds=args.early_stopping,
+        tree_method='hist',
+        eval_metric='auc',
+        n_jobs=threads,
+        random_state=args.seed,
+    )
+
+
+def fit(params: Dict, X: np.ndarray, y: np.ndarray, train: np.ndarray, val: np.ndarray, args, threads: int):
+    clf = make_classifier(params, args, threads)
+    clf.fit(X[train], y[train], eval_set=[(X[val], y[val])], verbose=False)
+    return clf
+
+
+def sample_params(rng: np.random.Generator) -> Dict:
+    params = {}
+    for name, (low, high, log) in SEARCH_SPACE.items():
+        if name == 'max_depth':
+            params[name] = int(rng.integers(low, high + 1))
+        elif log:
+            params[name] = float(np.exp(rng.uniform(np.log(low), np.log(high))))
+        else:
+            params[name] = float(rng.uniform(low, high))
+    return params
+
+
+def search(X: np.ndarray, y: np.ndarray, args, rng: np.random.Generator) -> List[Dict]:
+    """
+    Random search with k-fold CV. All (candidate, fold) fits share one
+    thread pool; XGBoost releases the GIL, so `jobs` fits run at once with
+    the cores split between them.
+    """
+    candidates = [DEFAULT_PARAMS] + [sample_params(rng) for _ in range(args.search)]
+    # Early stopping uses a slice of each fold's training rows, never the
+    # fold that is scored, which would bias the CV AUC upwards
+    folds = []
+    for train, val in stratified_folds(y, args.cv, rng):
+        inner_train, inner_val = stratified_split(y[train], args.val_size, rng)
+        folds.append((train[inner_train], train[inner_val], val))
+    workers = max(1, min(args.jobs, len(candidates) * len(folds)))
+    threads = max(1, args.jobs // workers)
+
+    def run(task):
+        c, (train, stop, val) = task
+        clf = fit(candidates[c], X, y, train, stop, args, threads)
+        return c, roc_auc(clf.predict_proba(X[val])[:, 1], y[val]), clf.best_iteration
+
+    tasks = [(c, fold) for c in range(len(candidates)) for fold in folds]
+    scores = [[] for _ in candidates]
+    rounds = [[] for _ in candidates]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for c, auc, best_iteration in pool.map(run, tasks):
+            scores[c].append(auc)
+            rounds[c].append(best_iteration)
+
+    results = [
+        {'params': params, 'cv_auc': float(np.mean(s)), 'cv_auc_std': float(np.std(s)),
+         'best_iteration': int(np.mean(r))}
+        for params, s, r in zip(candidates, scores, rounds)
+    ]
+    return sorted(results, key=lambda r: r['cv_auc'], reverse=True)
+
+
+# --- export ------------------------------------------------------------
+
+def export(clf, features: List[str], report: Dict, registry: Path, version: str, activate: bool) -> Path:
+    """
+    Write one registry version: the trimmed booster, the joblib classifier,
+    metadata.json (what app.inference reads) and the full report. The
+    directory is built under a temporary name and renamed into place, so
+    workers never see a half-written version.
+    """
+    import joblib
+
+    target = registry / version
+    if target.exists():
+        raise SystemExit(f"Model version {version} already exists in {registry}")
+    staging = registry / f'.{version}.tmp'
+    staging.mkdir(parents=True)
+
+    booster = clf.get_booster()
+    # inplace_predict on a loaded booster uses every tree, so keep only
+    # the ones early stopping selected
+    booster = booster[:clf.best_iteration + 1]
+    booster.save_model(str(staging / 'model.ubj'))
+    # Same trees as JSON for the NumPy scorer (INFERENCE_MODE=numpy)
+    booster.save_model(str(staging / 'model.json'))
+    joblib.dump(clf, staging / 'model.joblib')
+    metadata = {
+        'version': version,
+        'trained_at': report['trained_at'],
+        'features': features,
+        'encoder_cols': [],
+        'threshold': report['test']['threshold'],
+        'metrics': {
+            'roc_auc': report['test']['roc_auc'],
+            'roc_auc_ci': [report['test']['roc_auc_ci']['lower'], report['test']['roc_auc_ci']['upper']],
+            'precision': report['test']['precision'],
+            'recall': report['test']['recall'],
+            'f1': report['test']['f1'],
+        },
+        'params': report['params'],
+        'best_iteration': report['best_iteration'],
+        'train_rows': report['dataset']['train_rows'],
+    }
+    (staging / 'report.json').write_text(json.dumps(report, indent=2))
+    (staging / 'metadata.json').write_text(json.dumps(metadata, indent=2))
+    os.rename(staging, target)
+
+    if activate:
+        current = registry / 'CURRENT'
+        tmp = registry / f'.CURRENT.{os.getpid()}'
+        tmp.write_text(version + '\n')
+        os.replace(tmp, current)
+    return target
+
+
+def load_dataset(args) -> Tuple[np.ndarray, np.ndarray, List[str]]:
+    features = list(BASE_FEATURES)
+    if args.data:
+        if args.temporal:
+            # Exported events carry the rolling features computed on ingest
+            from app.features import TEMPORAL_FEATURES
+            features += TEMPORAL_FEATURES
+        X, y = read_exports(args.data, features, args.label)
+        if not len(y) or y.min() == y.max():
+            raise SystemExit(f'Need both classes of {args.label!r} in the exported rows, got {len(y)} rows')
+        return X, y, features
+    if args.temporal:
+        return simulate_streams(args.samples, args.fire_rate, args.noise, args.seed)
+    X, y = simulate(args.samples, args.fire_rate, args.noise, args.seed)
+    return X, y, features
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='Train and evaluate the vape detection model')
+    parser.add_argument('--data', type=Path, action='append',
+                        help='Exported events to train on (.ndjson, .csv or .parquet; repeatable) instead of simulated rows')
+    parser.add_argument('--label',
+                        help='Label field of --data rows, required with --data: verified (unreviewed events '
+                             'count as negatives), predicted_type (distills the serving model) or any 0/1 field')
+    parser.add_argument('--samples', type=int, default=1000, help='Simulated rows (default: 1000)')
+    parser.add_argument('--fire-rate', type=float, default=0.15, help='Share of vape rows (default: 0.15)')
+    parser.add_argument('--noise', type=float, default=0.05, help='Share of flipped labels (default: 0.05)')
+    parser.add_argument('--temporal', action='store_true',
+                        help='Also train on the rolling per-device features app.features computes on ingest')
+    parser.add_argument('--test-size', type=float, default=0.2)
+    parser.add_argument('--val-size', type=float, default=0.1,
+                        help='Share of the training rows used for early stopping (default: 0.1)')
+    parser.add_argument('--search', type=int, default=0, help='Random search candidates (default: 0, fixed params)')
+    parser.add_argument('--cv', type=int, default=3, help='CV folds for --search (default: 3)')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='Parallel threads (default: all cores)')
+    parser.add_argument('--max-rounds', type=int, default=1000, help='Upper bound on boosting rounds')
+    parser.add_argument('--early-stopping', type=int, default=50, help='Stop after this many rounds without improvement')
+    parser.add_argument('--bootstraps', type=int, default=1000, help='Bootstrap resamples for the AUC CI')
+    parser.add_argument('--threshold', type=float, default=0.5,
+                        help='Decision threshold for the precision/recall report (match PREDICTION_THRESHOLD)')
+    parser.add_argument('--seed', type=int, default=8)
+    parser.add_argument('--registry', type=Path, default=MODELS_DIR / 'registry',
+                        help='Model registry directory (default: backend/models/registry)')
+    parser.add_argument('--version', default=None, help='Registry version name (default: UTC timestamp)')
+    parser.add_argument('--activate', action='store_true',
+                        help='Point CURRENT at the new version; running workers hot-swap to it')
+    args = parser.parse_args(argv)
+    if args.data and not args.label:
+        parser.error('--data needs --label: which field of the exported rows is the ground truth')
+
+    timings = {}
+    started = time.perf_counter()
+    rng = np.random.default_rng(args.seed)
+
+    X, y, features = load_dataset(args)
+    timings['data_s'] = time.perf_counter() - started
+    print(f"Dataset: {len(y):,} rows, {int(y.sum()):,} positive, {len(features)} features")
+
+    rest, test = stratified_split(y, args.test_size, rng)
+
+    params, cv = dict(DEFAULT_PARAMS), None
+    if args.search:
+        mark = time.perf_counter()
+        cv = search(X[rest], y[rest], args, rng)
+        params = cv[0]['params']
+        timings['search_s'] = time.perf_counter() - mark
+        print(f"Search: best CV AUC {cv[0]['cv_auc']:.4f} ± {cv[0]['cv_auc_std']:.4f} "
+              f"({len(cv)} candidates x {args.cv} folds in {timings['search_s']:.1f}s)")
+
+    mark = time.perf_counter()
+    inner_train, inner_val = stratified_split(y[rest], args.val_size, rng)
+    clf = fit(params, X, y, rest[inner_train], rest[inner_val], args, args.jobs)
+    timings['train_s'] = time.perf_counter() - mark
+    print(f"Trained {clf.best_iteration + 1} rounds in {timings['train_s']:.1f}s")
+
+    mark = time.perf_counter()
+    scores = clf.predict_proba(X[test])[:, 1]
+    test_auc = roc_auc(scores, y[test])
+    ci = bootstrap_auc(scores, y[test], n_bootstraps=args.bootstraps, seed=args.seed)
+    timings['evaluate_s'] = time.perf_counter() - mark
+    print(f"Test ROC AUC: {test_auc:.4f} "
+          f"({ci['interval']:.0f}% CI [{ci['lower']:.4f}, {ci['upper']:.4f}], {ci['bootstraps']} resamples)")
+
+    timings['total_s'] = time.perf_counter() - started
+    report = {
+        'trained_at': datetime.utcnow().isoformat(),
+        'dataset': {
+            'rows': int(len(y)), 'positives': int(y.sum()), 'features': features,
+            'train_rows': int(len(rest)), 'test_rows': int(len(test)),
+            **({'data': [str(p) for p in args.data], 'label': args.label} if args.data else
+               {'samples': args.samples, 'fire_rate': args.fire_rate, 'noise': args.noise}),
+            'seed': args.seed,
+        },
+        'params': params,
+        'best_iteration': int(clf.best_iteration),
+        'search': cv,
+        'test': {
+            'roc_auc': test_auc,
+            'roc_auc_ci': ci,
+            **threshold_report(scores, y[test], args.threshold),
+        },
+        'timings': timings,
+    }
+    version = args.version or datetime.utcnow().strftime('%Y%m%d-%H%M%S')
+    target = export(clf, features, report, args.registry, version, args.activate)
+    print(f"Model version {version} written to {target}" + (' and activated' if args.activate else ''))
+
+
+if __name__ == '__main__':
+    main()
@@ -20,6 +20,14 @@ const char* password = "YOUR_WIFI_PASSWORD";
 // API Configuration
 const char* apiEndpoint = "https://your-vercel-app.vercel.app/api/sensors/data";
 // For local testing: "http://localhost:8000/api/sensors/data"
+const char* frameEndpoint = "https://your-vercel-app.vercel.app/api/sensors/frame";
+
+// Binary frames: buffer FRAME_READINGS readings and send them in one
+// compact POST (see backend/app/frames.py) instead of JSON per reading
+#define USE_BINARY_FRAMES true
+const int FRAME_READINGS = 6;            // one POST every 30 seconds
+const uint8_t FRAME_VERSION = 1;
+const float MISSING_VALUE = -999;
 
 // Pin Definitions
 #define BME_SCK 13
@@ -48,6 +56,20 @@ struct pms5003data {
 
 struct pms5003data data;
 
+// One buffered reading, packed little-endian exactly as sent
+struct __attribute__((packed)) FrameReading {
+  uint32_t ageMs;          // filled in when the frame is sent
+  float gasResistance, temperature, humidity, pressure, pm25, pm10, soundLevel;
+  int8_t wifiRssi;
+};
+
+FrameReading frameBuffer[FRAME_READINGS];
+unsigned long frameTakenAt[FRAME_READINGS];
+int frameCount = 0;
+
+// Reused across requests so the TCP/TLS connection is kept alive
+HTTPClient http;
+
 // Device Configuration
 const String DEVICE_ID = "ESP32_C6_001";  // Unique device identifier
 const String LOCATION = "School Bathroom - 2nd Floor";  // Device location
@@ -93,6 +115,7 @@ void setup() {
   
   // Initialize WiFi
   connectToWiFi();
+  http.setReuse(true);
   
   // Initial sensor calibration
   Serial.println("Calibrating sensors...");
@@ -188,6 +211,12 @@ void readAndSendSensorData() {
   Serial.println("PM10: " + String(pm10) + " μg/m³");
   Serial.println("Sound Level: " + String(soundLevel) + "%");
   
+  if (USE_BINARY_FRAMES) {
+    queueFrameReading(gasResistance, temperature, humidity, pressure, pm25, pm10, soundLevel);
+    checkAlertConditions(gasResistance, temperature, pm25);
+    return;
+  }
+  
   // Create JSON payload
   DynamicJsonDocument doc(1024);
   doc["device_id"] = DEVICE_ID;
@@ -227,7 +256,6 @@ void sendDataToAPI(String jsonData) {
     return;
   }
   
-  HTTPClient http;
   http.begin(apiEndpoint);
   http.addHeader("Content-Type", "application/json");
   http.setTimeout(HTTP_TIMEOUT);
@@ -250,15 +278,7 @@ void sendDataToAPI(String jsonData) {
       deserializeJson(responseDoc, response);
       
       if (responseDoc.containsKey("prediction")) {
-        String predictedClass = responseDoc["prediction"]["predicted_class"];
-        float confidence = responseDoc["prediction"]["confidence"];
-        
-        Serial.println("Prediction: " + predictedClass + " (" + String(confidence) + "% confidence)");
-        
-        // Trigger alert if vape detected with high confidence
-        if (predictedClass == "vape" && confidence > 70) {
-          triggerVapeAlert();
-        }
+        handlePrediction(responseDoc["prediction"]);
       }
     } else {
       Serial.println("✗ Server error: " + String(httpResponseCode));
@@ -269,9 +289,25 @@ void sendDataToAPI(String jsonData) {
     consecutiveFailures++;
   }
   
+  // With setReuse(true) this keeps the connection open for the next POST
   http.end();
   
-  // Handle consecutive failures
+  handleFailures();
+}
+
+void handlePrediction(JsonVariant prediction) {
+  String predictedType = prediction["predicted_type"];
+  float confidence = prediction["confidence"];  // probability, 0..1
+  
+  Serial.println("Prediction: " + predictedType + " (" + String(confidence * 100) + "% confidence)");
+  
+  // Trigger alert if vape detected with high confidence
+  if (predictedType == "vape" && confidence > 0.7) {
+    triggerVapeAlert();
+  }
+}
+
+void handleFailures() {
   if (consecutiveFailures >= MAX_FAILURES) {
     Serial.println("Too many consecutive failures. Restarting WiFi...");
     WiFi.disconnect();
@@ -281,6 +317,85 @@ void sendDataToAPI(String jsonData) {
   }
 }
 
+float frameValue(float value) {
+  return (value == MISSING_VALUE) ? NAN : value;
+}
+
+void queueFrameReading(float gasResistance, float temperature, float humidity, float pressure,
+                       float pm25, float pm10, float soundLevel) {
+  FrameReading &r = frameBuffer[frameCount];
+  r.gasResistance = frameValue(gasResistance);
+  r.temperature = frameValue(temperature);
+  r.humidity = frameValue(humidity);
+  r.pressure = frameValue(pressure);
+  r.pm25 = frameValue(pm25);
+  r.pm10 = frameValue(pm10);
+  r.soundLevel = soundLevel;
+  r.wifiRssi = (int8_t)WiFi.RSSI();
+  frameTakenAt[frameCount] = millis();
+  frameCount++;
+  
+  if (frameCount == FRAME_READINGS) {
+    sendFrame();
+  }
+}
+
+void sendFrame() {
+  size_t idLen = DEVICE_ID.length();
+  size_t locLen = LOCATION.length();
+  uint8_t frame[4 + idLen + locLen + FRAME_READINGS * sizeof(FrameReading)];
+  size_t n = 0;
+  
+  frame[n++] = FRAME_VERSION;
+  frame[n++] = (uint8_t)frameCount;
+  frame[n++] = (uint8_t)idLen;
+  memcpy(frame + n, DEVICE_ID.c_str(), idLen);
+  n += idLen;
+  frame[n++] = (uint8_t)locLen;
+  memcpy(frame + n, LOCATION.c_str(), locLen);
+  n += locLen;
+  
+  unsigned long now = millis();
+  for (int i = 0; i < frameCount; i++) {
+    frameBuffer[i].ageMs = now - frameTakenAt[i];
+    memcpy(frame + n, &frameBuffer[i], sizeof(FrameReading));
+    n += sizeof(FrameReading);
+  }
+  
+  http.begin(frameEndpoint);
+  http.addHeader("Content-Type", "application/vnd.vapeguard.frame");
+  http.setTimeout(HTTP_TIMEOUT);
+  
+  Serial.println("Sending " + String(frameCount) + " readings (" + String(n) + " bytes) to: " + String(frameEndpoint));
+  
+  int httpResponseCode = http.POST(frame, n);
+  
+  if (httpResponseCode == 201 || httpResponseCode == 202) {
+    Serial.println("✓ Frame sent successfully!");
+    consecutiveFailures = 0;
+    frameCount = 0;
+    
+    DynamicJsonDocument responseDoc(4096);
+    deserializeJson(responseDoc, http.getString());
+    for (JsonVariant result : responseDoc["results"].as<JsonArray>()) {
+      if (result.containsKey("prediction")) {
+        handlePrediction(result["prediction"]);
+      }
+    }
+  } else {
+    Serial.println("✗ Frame upload failed: " + String(httpResponseCode));
+    consecutiveFailures++;
+    // Keep the buffered readings, dropping the oldest to make room
+    memmove(frameBuffer, frameBuffer + 1, (FRAME_READINGS - 1) * sizeof(FrameReading));
+    memmove(frameTakenAt, frameTakenAt + 1, (FRAME_READINGS - 1) * sizeof(unsigned long));
+    frameCount = FRAME_READINGS - 1;
+  }
+  
+  http.end();
+  
+  handleFailures();
+}
+
 void checkAlertConditions(float gasResistance, float temperature, float pm25) {
   // Local alert conditions (independent of ML model)
   bool gasAlert = gasResistance < 50.0;  // Low gas resistance indicates VOCs
@@ -4,17 +4,24 @@ Sensor Data Simulator for Vape Detection System
 
 This script simulates sensor data for testing the vape detection system.
 It generates random sensor readings and sends them to the API endpoint.
+
+With --load it instead runs many virtual devices concurrently (asyncio +
+httpx with pooled connections) at a target aggregate rate, including
+vape/fire incident bursts, and reports latency percentiles, throughput
+and error rates:
+
+    python simulate_sensor.py --load --devices 2000 --rate 400 --duration 60
 """
 
 import argparse
+import asyncio
 import json
 import random
 import time
 import uuid
+from collections import Counter
 from datetime import datetime
 
-import requests
-
 # Default configuration
 DEFAULT_API_URL = "http://localhost:8000/api/sensors/data"
 DEFAULT_INTERVAL = 5  # seconds
@@ -30,6 +37,11 @@ VOLUME_SPIKE_RANGE = (40, 80)  # dB
 VAPE_EVENT_PROBABILITY = 0.1  # 10% chance of vape event
 FIRE_EVENT_PROBABILITY = 0.05  # 5% chance of fire event
 
+# Load mode: chance per reading that a device starts an incident burst,
+# and how many consecutive readings a burst lasts
+DEFAULT_BURST_PROBABILITY = 0.01
+BURST_LENGTH_RANGE = (3, 12)
+
 
 def generate_normal_data(device_id):
     """Generate normal sensor data."""
@@ -69,19 +81,21 @@ def generate_fire_data(device_id):
 
 def send_data(api_url, data):
     """Send data to the API endpoint."""
+    import requests
+
     try:
         headers = {"Content-Type": "application/json"}
         response = requests.post(api_url, json=data, headers=headers)
         
-        if response.status_code == 200:
+        # 201 Created, or 202 Accepted when the API uses write-behind
+        if response.status_code in (200, 201, 202):
             result = response.json()
-            print(f"Data sent successfully: {json.dumps(data, indent=2)}")
-            print(f"Response: {json.dumps(result, indent=2)}")
+            print(f"Data sent successfully: event {result.get('event_id')}")
             
             # Print prediction if available
-            if "data" in result and "prediction" in result["data"]:
-                prediction = result["data"]["prediction"]
-                print(f"Prediction: {prediction['type']} with {prediction['confidence']}% confidence")
+            prediction = result.get("prediction")
+            if prediction:
+                print(f"Prediction: {prediction['predicted_type']} with {prediction['confidence'] * 100:.1f}% confidence")
         else:
             print(f"Error sending data: {response.status_code} - {response.text}")
     except Exception as e:
@@ -133,6 +147,160 @@ def simulate_data(api_url, device_id, interval, duration=None, force_event=None)
     print("Simulation complete")
 
 
+class VirtualDevice:
+    """One simulated sensor for load mode, with occasional incident bursts."""
+
+    def __init__(self, device_id, burst_probability):
+        self.device_id = device_id
+        self.burst_probability = burst_probability
+        self.burst_kind = None
+        self.burst_remaining = 0
+
+    def next_reading(self):
+        if self.burst_remaining == 0 and random.random() < self.burst_probability:
+            # Same vape:fire mix as the single-device simulation
+            vape_share = VAPE_EVENT_PROBABILITY / (VAPE_EVENT_PROBABILITY + FIRE_EVENT_PROBABILITY)
+            self.burst_kind = "vape" if random.random() < vape_share else "fire"
+            self.burst_remaining = random.randint(*BURST_LENGTH_RANGE)
+        if self.burst_remaining > 0:
+            self.burst_remaining -= 1
+            generate = generate_vape_data if self.burst_kind == "vape" else generate_fire_data
+            return self.burst_kind, generate(self.device_id)
+        return "normal", generate_normal_data(self.device_id)
+
+
+class LoadStats:
+    def __init__(self):
+        self.latencies = []
+        self.statuses = Counter()
+        self.errors = Counter()
+        self.kinds = Counter()
+        self.completed = 0
+        self.started = time.perf_counter()
+
+    def record(self, latency, status=None, error=None):
+        self.completed += 1
+        if error is not None:
+            self.errors[error] += 1
+            return
+        self.statuses[status] += 1
+        if 200 <= status < 300:
+            self.latencies.append(latency)
+        else:
+            self.errors[f"HTTP {status}"] += 1
+
+    def report(self):
+        elapsed = time.perf_counter() - self.started
+        latencies = sorted(self.latencies)
+        failed = sum(self.errors.values())
+
+        def percentile(q):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000, 2)
+
+        return {
+            "duration_s": round(elapsed, 2),
+            "requests": self.completed,
+            "succeeded": len(latencies),
+            "failed": failed,
+            "error_rate": round(failed / self.completed, 4) if self.completed else 0.0,
+            "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+            "latency_ms": {
+                "p50": percentile(0.50),
+                "p95": percentile(0.95),
+                "p99": percentile(0.99),
+                "max": round(latencies[-1] * 1000, 2) if latencies else None,
+            },
+            "statuses": {str(k): v for k, v in sorted(self.statuses.items())},
+            "errors": dict(self.errors),
+            "readings": dict(self.kinds),
+        }
+
+
+async def run_device(client, api_url, device, interval, first_at, end_at, stats, in_flight):
+    """Send a reading every `interval` seconds on a fixed schedule."""
+    loop = asyncio.get_running_loop()
+    scheduled = first_at
+    while scheduled < end_at:
+        delay = scheduled - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        kind, data = device.next_reading()
+        stats.kinds[kind] += 1
+        # Fire and forget so a slow response doesn't delay the schedule;
+        # latency is measured from the scheduled time (no coordinated omission)
+        task = asyncio.create_task(send_timed(client, api_url, data, scheduled, stats))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+        scheduled += interval
+
+
+async def send_timed(client, api_url, data, scheduled, stats):
+    loop = asyncio.get_running_loop()
+    try:
+        response = await client.post(api_url, json=data)
+        stats.record(loop.time() - scheduled, status=response.status_code)
+    except Exception as e:
+        stats.record(loop.time() - scheduled, error=type(e).__name__)
+
+
+async def report_progress(stats, every):
+    last_count, last_time = 0, time.perf_counter()
+    while True:
+        await asyncio.sleep(every)
+        now = time.perf_counter()
+        count = stats.completed
+        recent = sorted(stats.latencies[-1000:])
+        p95 = recent[int(0.95 * (len(recent) - 1))] * 1000 if recent else 0.0
+        print(f"[{now - stats.started:6.1f}s] {(count - last_count) / (now - last_time):8.1f} req/s  "
+              f"p95 {p95:7.1f} ms  errors {sum(stats.errors.values())}")
+        last_count, last_time = count, now
+
+
+async def run_load(api_url, devices, rate, duration, connections, burst_probability, timeout):
+    """Simulate `devices` sensors sending `rate` readings per second in total."""
+    import httpx
+
+    interval = devices / rate
+    print(f"Load test: {devices} devices, {rate} readings/s total "
+          f"(one every {interval:.2f}s per device) for {duration}s against {api_url}")
+
+    stats = LoadStats()
+    in_flight = set()
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+    async with httpx.AsyncClient(limits=limits, timeout=timeout) as client:
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        end_at = start + duration
+        progress = asyncio.create_task(report_progress(stats, 5))
+        # Spread each device's first reading over one interval
+        await asyncio.gather(*(
+            run_device(client, api_url, VirtualDevice(f"load-{i:05d}", burst_probability),
+                       interval, start + random.uniform(0, interval), end_at, stats, in_flight)
+            for i in range(devices)
+        ))
+        if in_flight:
+            await asyncio.wait(in_flight)
+        progress.cancel()
+    return stats.report()
+
+
+def print_report(report):
+    latency = report["latency_ms"]
+    print("\n=== Load test results ===")
+    print(f"Duration:    {report['duration_s']} s")
+    print(f"Requests:    {report['requests']} ({report['succeeded']} ok, {report['failed']} failed, "
+          f"error rate {report['error_rate'] * 100:.2f}%)")
+    print(f"Throughput:  {report['throughput_rps']} req/s")
+    print(f"Latency:     p50 {latency['p50']} ms  p95 {latency['p95']} ms  "
+          f"p99 {latency['p99']} ms  max {latency['max']} ms")
+    print(f"Statuses:    {report['statuses']}")
+    if report["errors"]:
+        print(f"Errors:      {report['errors']}")
+    print(f"Readings:    {report['readings']}")
+
+
 def main():
     """Main function to parse arguments and start simulation."""
     parser = argparse.ArgumentParser(description="Simulate sensor data for vape detection system")
@@ -163,8 +331,34 @@ def main():
         help="Force a specific event type (normal, vape, or fire)"
     )
     
+    load = parser.add_argument_group("load mode")
+    load.add_argument("--load", action="store_true", help="Simulate many concurrent devices and report latency")
+    load.add_argument("--devices", type=int, default=1000, help="Number of virtual devices (default: 1000)")
+    load.add_argument("--rate", type=float, default=200, help="Aggregate readings per second (default: 200)")
+    load.add_argument("--connections", type=int, default=100, help="Max pooled HTTP connections (default: 100)")
+    load.add_argument("--burst-probability", type=float, default=DEFAULT_BURST_PROBABILITY,
+                      help=f"Chance per reading of starting an incident burst (default: {DEFAULT_BURST_PROBABILITY})")
+    load.add_argument("--timeout", type=float, default=10, help="Request timeout in seconds (default: 10)")
+    load.add_argument("--report", help="Also write the results as JSON to this file")
+    
     args = parser.parse_args()
     
+    if args.load:
+        report = asyncio.run(run_load(
+            api_url=args.api_url,
+            devices=args.devices,
+            rate=args.rate,
+            duration=args.duration or 60,
+            connections=args.connections,
+            burst_probability=args.burst_probability,
+            timeout=args.timeout,
+        ))
+        print_report(report)
+        if args.report:
+            with open(args.report, "w") as f:
+                json.dump(report, f, indent=2)
+        return
+    
     simulate_data(
         api_url=args.api_url,
         device_id=args.device_id,